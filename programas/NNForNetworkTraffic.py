@@ -13,6 +13,29 @@
 # [badXValTxt] => fichero .txt con el tráfico anormal del futuro validation set.
 # [goodXTestTxt] => fichero .txt con el tráfico "bueno" del futuro test set.
 # [badXTestTxt] => fichero .txt con el tráfico anormal del futuro test set.
+# [cacheDir] => (opcional) directorio de la caché de paquetes ya leídos
+#				(ver datasetCache.py). Vacío para no usar la caché.
+# [MB] => (opcional) tamaño máximo de la caché en MB.
+# [stream] => (opcional) 1 para leer los ficheros por bloques mientras se
+#			  entrena (para capturas que no caben en memoria).
+# [rows] => (opcional) muestras del buffer de mezcla en modo stream.
+# [modelFile] => (opcional) fichero .keras donde se guarda el modelo entrenado
+#				 (con numFeatures en su .json, ver modelStore.py) para
+#				 clasificar tráfico después con scoreTraffic.py. Vacío para
+#				 no guardarlo.
+# [batch] => (opcional) muestras por lote (512 por defecto). En máquinas con
+#			 muchos núcleos, lotes más grandes los aprovechan mejor.
+# [threads], [interThreads] => (opcional) hilos de TensorFlow dentro de cada
+#							   operación y operaciones a la vez (0 para que
+#							   los elija TensorFlow según los núcleos).
+# [precision] => (opcional) float32 (por defecto) o bfloat16: las capas
+#				 calculan en bfloat16 (más rápido en CPUs con AVX512_BF16 o
+#				 AMX) y guardan los pesos en float32.
+# [xla] => (opcional) 1 para compilar el modelo con XLA, 0 para no hacerlo y
+#		   auto (por defecto) para que lo decida Keras.
+# [TFG_PROFILE] => (opcional, variable de entorno) 1 o fichero .json para medir
+#				   cada paso: carga, entrenamiento (con el tiempo de cada época)
+#				   y test (ver stageProfiler.py).
 
 # SALIDAS:
 # 1. Porcentaje de paquetes del test set clasificados correctamente por la red neuronal
@@ -24,31 +47,64 @@
 # número de paquetes totales.
 #
 # 3. Suma de porcentaje correcto + incorrecto => siempre debe ser 1.0.
+#
+# 4. Muestras por segundo de cada época del entrenamiento y su media (sin la
+# primera época, que incluye la compilación del modelo).
+#
+# 5. Tomando el tráfico anómalo como clase positiva: matriz de confusión,
+# precision, recall, F1 y área bajo las curvas ROC y PR (ver
+# evaluationMetrics.py).
 
 # EJEMPLO DE EJECUCIÓN:
 # python3 NNForNetworkTraffic.py features=88
 #	goodXTrain=cap-ipv6-train.txt	badXTrain=cap-ipv6-train-NS.txt
 #	goodXVal=cap-ipv6-val.txt		badXVal=cap-ipv6-val-NS.txt
 #	goodXTest=cap-ipv6-test.txt		badXTest=cap-ipv6-test-NS.txt
+#	[cache=/tmp/cache-tfg]			[cacheSize=2048]
+#	[stream=1]						[buffer=65536]
+#	[model=modelo-ipv6-NS.keras]
+#	[batch=4096]	[threads=16]	[interThreads=2]	[precision=bfloat16]	[xla=1]
 ##############################################################################
 
 import readTxtFile as rtxt
-import numpy as np
-from keras import models, layers
-import matplotlib.pyplot as plt
+import datasetCache as cache
+import streamDataset as sds
+import modelStore
+import evaluationMetrics as em
+import stageProfiler as prof
+from keras import models, layers, utils, callbacks, mixed_precision
+import time
 import sys
 
 # Comprueba si se ha ejecutado el programa con el número de argumentos correctos.
 # Si el número es correcto, guarda [numFeatures], [goodXTrainTxt], [badXTrainTxt],
-# [goodXValTxt], [badXValTxt], [goodXTestTxt] y [badXTestTxt].
+# [goodXValTxt], [badXValTxt], [goodXTestTxt] y [badXTestTxt], además de las
+# opciones que se hayan indicado detrás (como [opción]=[valor]).
 def checkExecution():
 	datasetTxt = {}
-	if len(sys.argv) != 8:
+	options = {"cache": cache.DIR_CACHE, "cacheSize": str(cache.TAM_CACHE >> 20),
+		"stream": "0", "buffer": str(sds.TAM_BUFFER), "model": "modelo.keras", "batch": "512",
+		"threads": "0", "interThreads": "0", "precision": "float32", "xla": "auto"}
+	optionsArgv = [arg.split("=")[0] for arg in sys.argv[8:]]
+	if len(sys.argv) < 8 or not all(key in options for key in optionsArgv):
 		print("")
 		print("usage: python3 NNForNetworkTraffic.py features=[numFeatures] " +
 			"goodXTrain=[goodXTrainTxt] badXTrain=[badXTrainTxt] " +
 			"goodXVal=[goodXValTxt] badXVal=[badXValTxt] " +
-			"goodXTest=[goodXTestTxt] badXTest=[badXTestTxt]")
+			"goodXTest=[goodXTestTxt] badXTest=[badXTestTxt] " +
+			"[cache=[cacheDir]] [cacheSize=[MB]] [stream=0|1] [buffer=[rows]] [model=[modelFile]] " +
+			"[batch=[N]] [threads=[N]] [interThreads=[N]] [precision=float32|bfloat16] [xla=auto|0|1]")
+		print("")
+		print("  cache => directorio de la caché de paquetes ya leídos (vacío para no usarla).")
+		print("  cacheSize => tamaño máximo de la caché en MB.")
+		print("  stream => 1 para leer los ficheros por bloques en lugar de cargarlos enteros.")
+		print("  buffer => muestras del buffer de mezcla en modo stream.")
+		print("  model => fichero .keras donde se guarda el modelo entrenado (vacío para no guardarlo).")
+		print("  batch => muestras por lote (512 por defecto).")
+		print("  threads => hilos de TensorFlow para cada operación (0 = uno por núcleo).")
+		print("  interThreads => operaciones de TensorFlow a la vez (0 = según los núcleos).")
+		print("  precision => float32 o bfloat16 (cálculos en bfloat16 y pesos en float32).")
+		print("  xla => compilar el modelo con XLA (auto = si Keras lo ve posible).")
 		sys.exit()
 	numFeatures = int(sys.argv[1].split("=")[-1])				# 50 para IPv4, 88 para IPv6.
 	datasetTxt["goodXTrainTxt"] = sys.argv[2].split("=")[-1]	# Separo por "=" y me quedo con el último elemento de la lista.
@@ -57,65 +113,202 @@ def checkExecution():
 	datasetTxt["badXValTxt"] = sys.argv[5].split("=")[-1]
 	datasetTxt["goodXTestTxt"] = sys.argv[6].split("=")[-1]
 	datasetTxt["badXTestTxt"] = sys.argv[7].split("=")[-1]
-	return numFeatures, datasetTxt
+	for arg in sys.argv[8:]:
+		key, value = arg.split("=", 1)
+		options[key] = value
+	return numFeatures, datasetTxt, options
+
+# Lotes de un PacketDataset para Keras: las muestras siguen en uint8 hasta que
+# se pide cada lote, que se normaliza entonces a float32.
+class PacketSequence(utils.Sequence):
+	def __init__(self, packetDataset, batchSize, shuffle=False):
+		super().__init__()
+		self.packetDataset = packetDataset
+		self.batchSize = batchSize
+		self.shuffle = shuffle
+
+	def __len__(self):
+		return (len(self.packetDataset) + self.batchSize - 1) // self.batchSize
+
+	def __getitem__(self, i):
+		return self.packetDataset.getBatch(i * self.batchSize, (i + 1) * self.batchSize)
+
+	def on_epoch_end(self):
+		if self.shuffle:
+			self.packetDataset.shuffle()			# Como model.fit(shuffle=True) con matrices.
 
 # Genera el dataset final que se va a inyectar en la red neuronal (en base a la
 # a las capturas almacenadas en formato .txt con la información del tráfico
 # "bueno" y "malo" por separado).
-def generateDataset(datasetTxt, numFeatures):
+def generateDataset(datasetTxt, numFeatures, options):
+	if options.get("stream") == "1":
+		return generateStreamDataset(datasetTxt, numFeatures, options)
 	dataset = {}
+	cacheDir = options.get("cache")
+	cacheBytes = int(options.get("cacheSize")) << 20
+	batchSize = int(options.get("batch", 512))
+
 	goodXTrainTxt = datasetTxt.get("goodXTrainTxt")
 	badXTrainTxt = datasetTxt.get("badXTrainTxt")
-	dataset["xTrain"], dataset["yTrain"] = rtxt.createDataset(goodXTrainTxt, badXTrainTxt, numFeatures)
+	trainSet = rtxt.createDataset(goodXTrainTxt, badXTrainTxt, numFeatures, cacheDir, cacheBytes)
+	dataset["train"] = PacketSequence(trainSet, batchSize, shuffle=True)
+	dataset["trainRows"] = len(trainSet)
 
 	goodXValTxt = datasetTxt.get("goodXValTxt")
 	badXValTxt = datasetTxt.get("badXValTxt")
-	dataset["xVal"], dataset["yVal"] = rtxt.createDataset(goodXValTxt, badXValTxt, numFeatures)
+	valSet = rtxt.createDataset(goodXValTxt, badXValTxt, numFeatures, cacheDir, cacheBytes)
+	dataset["val"] = PacketSequence(valSet, batchSize)
 
 	goodXTestTxt = datasetTxt.get("goodXTestTxt")
 	badXTestTxt = datasetTxt.get("badXTestTxt")
-	dataset["xTest"], dataset["yTest"] = rtxt.createDataset(goodXTestTxt, badXTestTxt, numFeatures)
+	testSet = rtxt.createDataset(goodXTestTxt, badXTestTxt, numFeatures, cacheDir, cacheBytes)
+	dataset["test"] = PacketSequence(testSet, batchSize)
+	return dataset
+
+# Genera el dataset en streaming (opción stream=1): en lugar de cargar los
+# ficheros, cada subconjunto es un generador de lotes que los va leyendo por
+# bloques (ver streamDataset.py), junto con su número de lotes por época.
+def generateStreamDataset(datasetTxt, numFeatures, options):
+	dataset = {}
+	cacheDir = options.get("cache")
+	bufferRows = int(options.get("buffer"))
+	batchSize = int(options.get("batch", 512))
+	for part in ["Train", "Val", "Test"]:
+		goodTxt = datasetTxt.get("goodX" + part + "Txt")
+		badTxt = datasetTxt.get("badX" + part + "Txt")
+		repeat = part != "Test"										# Train y Val se recorren una vez por época.
+		totals = [sds.countRows(path, numFeatures, cacheDir) for path in [goodTxt, badTxt]]
+		rows = sum(totals)
+		dataset[part.lower()] = sds.streamBatches(goodTxt, badTxt, numFeatures, batchSize, bufferRows, cacheDir,
+			repeat, totals=totals)
+		dataset[part.lower() + "Steps"] = (rows + batchSize - 1) // batchSize
+		dataset[part.lower() + "Rows"] = rows
 	return dataset
 
-# Construye la red neuronal.
-def buildNN(numFeatures):
+# Configura TensorFlow para entrenar en CPU según las opciones: hilos por
+# operación ([threads]), operaciones a la vez ([interThreads]) y precisión de
+# los cálculos ([precision]). Se tiene que llamar antes de crear el modelo.
+def configureCPU(options):
+	try:
+		import tensorflow as tf
+		tf.config.threading.set_intra_op_parallelism_threads(int(options.get("threads", 0)))
+		tf.config.threading.set_inter_op_parallelism_threads(int(options.get("interThreads", 0)))
+	except ImportError:
+		pass												# Otro backend de Keras: sus valores por defecto.
+	if options.get("precision", "float32") == "bfloat16":
+		mixed_precision.set_global_policy("mixed_bfloat16")
+
+# Construye la red neuronal: una capa oculta por cada elemento de [units] (con
+# ese número de neuronas) y el optimizador [optimizer]. Con [jitCompile], el
+# modelo se compila con XLA ("auto" para que lo decida Keras). La capa de
+# salida calcula siempre en float32, también con precision=bfloat16.
+def buildNN(numFeatures, units=(32, 32), optimizer='rmsprop', jitCompile="auto"):
 	model = models.Sequential()
-	model.add(layers.Dense(32, activation='relu', input_shape=(numFeatures,)))
-	model.add(layers.Dense(32, activation='relu'))
-	model.add(layers.Dense(1, activation='sigmoid'))
+	model.add(layers.Dense(units[0], activation='relu', input_shape=(numFeatures,)))
+	for n in units[1:]:
+		model.add(layers.Dense(n, activation='relu'))
+	model.add(layers.Dense(1, activation='sigmoid', dtype='float32'))
 
-	model.compile(optimizer='rmsprop', loss='binary_crossentropy', metrics=['accuracy'])
+	model.compile(optimizer=optimizer, loss='binary_crossentropy', metrics=['accuracy'], jit_compile=jitCompile)
 	return model
 
-# Entrena la red neuronal (con el training set)
-def trainNN(model, dataset):
-	xTrain = dataset.get("xTrain")
-	yTrain = dataset.get("yTrain")
-	xVal = dataset.get("xVal")
-	yVal = dataset.get("yVal")
-	history = model.fit(xTrain, yTrain, epochs=20, batch_size=512, validation_data=(xVal, yVal))
+# Añade a la línea de cada época de Keras (y a su historial) cuántas muestras
+# por segundo se han entrenado y, al acabar el entrenamiento, muestra la media
+# de todas las épocas salvo la primera (que incluye la compilación del modelo).
+# Solo se cuenta el tiempo de entrenamiento de la época: el reloj se para al
+# empezar la pasada por el validation set.
+class ThroughputReport(callbacks.Callback):
+	def __init__(self, trainRows):
+		super().__init__()
+		self.trainRows = trainRows
+		self.rates = []
 
-# Prueba la red neuronal clasificando tráfico nuevo (el del test set)
-def testNN(model, dataset):
-	xTest = dataset.get("xTest")
-	yTest = dataset.get("yTest")
-	yPredictionsMatrix = model.predict(xTest)											# Matriz (X, 1)
-	yPredictionsVector = np.reshape(yPredictionsMatrix, np.size(yPredictionsMatrix))	# Vector (X,)
+	def on_epoch_begin(self, epoch, logs=None):
+		self.start = time.perf_counter()
+		self.trainSeconds = None
+
+	def on_test_begin(self, logs=None):
+		if self.trainSeconds is None:
+			self.trainSeconds = time.perf_counter() - self.start
+
+	def on_epoch_end(self, epoch, logs=None):
+		if self.trainSeconds is None:						# Sin validation set.
+			self.trainSeconds = time.perf_counter() - self.start
+		self.rates.append(self.trainRows / max(self.trainSeconds, 1e-9))
+		if logs is not None:
+			logs["samples_per_second"] = self.rates[-1]
+
+	# Devuelve la media de muestras/s de las épocas (sin la primera, si hay más).
+	def meanRate(self):
+		rates = self.rates[1:] or self.rates
+		return sum(rates) / len(rates) if rates else None
+
+	def on_train_end(self, logs=None):
+		if self.rates:
+			print("· Entrenamiento: " + "%.0f" % self.meanRate() + " muestras/s de media")
+
+# Entrena la red neuronal (con el training set) durante [epochs] épocas (o
+# menos, si algún callback de [callbacks] la para antes) y, si se indica
+# [modelPath], la guarda junto con [numFeatures] para poder clasificar tráfico
+# después. Devuelve el historial del entrenamiento.
+@prof.stage("trainNN")
+def trainNN(model, dataset, numFeatures=None, modelPath=None, epochs=20, callbacks=()):
+	history = model.fit(dataset.get("train"), steps_per_epoch=dataset.get("trainSteps"), epochs=epochs,
+		validation_data=dataset.get("val"), validation_steps=dataset.get("valSteps"),
+		callbacks=prof.kerasCallbacks() + list(callbacks))
+	if dataset.get("trainRows") is not None:
+		prof.addRows(len(history.epoch) * dataset.get("trainRows"))
+	if modelPath:
+		modelStore.saveModel(model, numFeatures, modelPath)
+		print("· Modelo guardado en " + modelPath)
+	return history
 
-	accPredictions = np.sum(yTest == np.around(yPredictionsVector)) / np.size(yTest)
-	inaccPredictions = np.sum(yTest != np.around(yPredictionsVector)) / np.size(yTest)
+# Clasifica el test set lote a lote (para que tampoco tenga que caber en
+# memoria) y devuelve el resumen de sus métricas, acumuladas en una sola
+# pasada (ver evaluationMetrics.py).
+def evaluateNN(model, dataset):
+	testSet = dataset.get("test")
+	if isinstance(testSet, PacketSequence):
+		testSequence = testSet
+		testSet = (testSequence[i] for i in range(len(testSequence)))
+
+	metrics = em.newMetrics()
+	for xTest, yTest in testSet:
+		em.updateMetrics(metrics, yTest, model.predict_on_batch(xTest))
+	return em.summarizeMetrics(metrics)
+
+# Prueba la red neuronal clasificando tráfico nuevo (el del test set).
+@prof.stage("testNN")
+def testNN(model, dataset):
+	summary = evaluateNN(model, dataset)
+	(tn, fp), (fn, tp) = summary.get("confusion").tolist()
+	prof.addRows(tn + fp + fn + tp)
 
 	print("")
 	print("####################################################")
 	print("Probando la red neuronal sobre tráfico nuevo (xTest)")
 	print("####################################################")
-	print("· Precisión (0-1)      =  " + str(accPredictions))
-	print("· Imprecisión (0-1)    =  " + str(inaccPredictions))
-	print("· Total (debe ser 1.0) =  " + str(accPredictions + inaccPredictions))
-
+	print("· Precisión (0-1)      =  " + str(summary.get("accuracy")))
+	print("· Imprecisión (0-1)    =  " + str(summary.get("inaccuracy")))
+	print("· Total (debe ser 1.0) =  " + str(summary.get("accuracy") + summary.get("inaccuracy")))
+	print("")
+	print("Tráfico anómalo como clase positiva:")
+	print("· Matriz de confusión  =  [[VN = " + str(tn) + ", FP = " + str(fp) + "], [FN = " +
+		str(fn) + ", VP = " + str(tp) + "]]")
+	print("· Precision (0-1)      =  " + str(summary.get("precision")))
+	print("· Recall (0-1)         =  " + str(summary.get("recall")))
+	print("· F1 (0-1)             =  " + str(summary.get("f1")))
+	print("· AUC ROC (0-1)        =  " + str(summary.get("rocAuc")))
+	print("· AUC PR (0-1)         =  " + str(summary.get("prAuc")))
 
-numFeatures, datasetTxt = checkExecution()
-dataset = generateDataset(datasetTxt, numFeatures)
-model = buildNN(numFeatures)
-trainNN(model, dataset)
-testNN(model, dataset)
+# El programa solo se ejecuta al lanzarlo (no al importarlo, por ejemplo desde
+# benchmarkPipeline.py).
+if __name__ == "__main__":
+	numFeatures, datasetTxt, options = checkExecution()
+	configureCPU(options)
+	dataset = generateDataset(datasetTxt, numFeatures, options)
+	xla = {"1": True, "0": False}.get(options.get("xla"), "auto")
+	model = buildNN(numFeatures, jitCompile=xla)
+	trainNN(model, dataset, numFeatures, options.get("model"),
+		callbacks=[ThroughputReport(dataset.get("trainRows"))])
+	testNN(model, dataset)
@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa que mide cuánto tarda cada paso del proceso completo, desde la
+# captura hasta la clasificación del test set, con capturas sintéticas
+# generadas en local (sin red ni capturas reales):
+#
+# 1. Genera una captura "buena" de [packets] paquetes IPv4 y/o IPv6 (Ethernet
+#	 + TCP, UDP o ICMP con direcciones, puertos y tamaños aleatorios).
+# 2. Genera su versión anómala: direcciones Ethernet e IP intercambiadas
+#	 (generateBadIPv4Pcap.py) o ataque NS (generateBadIPv6Pcap.py).
+# 3. Extrae los bytes de los paquetes a .txt (con fromPcapToTxt.sh si está
+#	 tshark; si no, con el mismo formato desde Python) y a .npy
+#	 (fromPcapToNpy.py), separando training, validation y test set (60/20/20).
+# 4. Carga los datasets (readTxtFile.createDataset, sin caché).
+# 5. Entrena la red neuronal (trainNN) durante [epochs] épocas.
+# 6. Clasifica el test set (testNN).
+#
+# De cada paso se guarda el tiempo, los paquetes por segundo, los MB por
+# segundo (del fichero que lee) y su pico de memoria, en un fichero JSON para
+# poder comparar versiones. El pico se reinicia al empezar cada paso (ver
+# stageProfiler.py), así que es el del paso y no el de todo el proceso; como
+# el proceso ya tiene cargado Keras, se guarda también lo que ha crecido la
+# memoria durante el paso sobre la que había al empezar.
+
+# ENTRADAS:
+# [packets] => (opcional) paquetes de cada captura sintética (20000).
+# [family] => (opcional) "ipv4", "ipv6" o "ipv4,ipv6" (por defecto, las dos).
+# [epochs] => (opcional) épocas de entrenamiento (2).
+# [seed] => (opcional) semilla de las capturas sintéticas (0).
+# [dir] => (opcional) directorio de trabajo. Vacío (por defecto) para usar uno
+#		   temporal que se borra al acabar.
+# [output] => (opcional) fichero JSON con los resultados (benchmark.json).
+
+# SALIDAS:
+# 1. Tabla con el tiempo, paquetes/s, MB/s, pico de memoria y memoria añadida
+#	 de cada paso.
+# 2. Fichero [output] con lo mismo, además de la versión del código (commit
+#	 de git) y de Python, NumPy y Keras.
+
+# EJEMPLO DE EJECUCIÓN:
+# python3 benchmarkPipeline.py [packets=20000] [family=ipv4,ipv6] [epochs=2] [output=benchmark.json]
+###############################################################################
+
+import readPcapFile as rpcap
+import generateBadIPv4Pcap as ipv4
+import generateBadIPv6Pcap as ipv6
+import NNForNetworkTraffic as nn
+import stageProfiler as prof
+import numpy as np
+import keras
+import contextlib
+import subprocess
+import platform
+import tempfile
+import shutil
+import struct
+import json
+import time
+import sys
+import io
+import os
+
+# Bytes por paquete con los que se entrena cada familia (como en el TFG).
+FEATURES = {"ipv4": 50, "ipv6": 88}
+
+# Comprueba si se ha ejecutado bien el programa y devuelve las opciones que se
+# hayan indicado (como [opción]=[valor]).
+def checkExecution():
+	options = {"packets": "20000", "family": "ipv4,ipv6", "epochs": "2", "seed": "0",
+		"dir": "", "output": "benchmark.json"}
+	optionsArgv = [arg.split("=")[0] for arg in sys.argv[1:]]
+	if not all(key in options for key in optionsArgv):
+		print("usage: python3 benchmarkPipeline.py [packets=[N]] [family=ipv4,ipv6] " +
+			"[epochs=[N]] [seed=[N]] [dir=[workDir]] [output=[file.json]]")
+		sys.exit(1)
+	for arg in sys.argv[1:]:
+		key, value = arg.split("=", 1)
+		options[key] = value
+	if not all(family in FEATURES for family in options.get("family").split(",")):
+		print("Error: familias válidas: " + ", ".join(FEATURES))
+		sys.exit(1)
+	return options
+
+# Devuelve la cabecera Ethernet (direcciones aleatorias) de un paquete.
+def ethernetHeader(rng, etherType):
+	return rng.bytes(12) + struct.pack("!H", etherType)
+
+# Devuelve la cabecera de transporte (TCP, UDP o ICMP/ICMPv6 echo) y su
+# número de protocolo, con el checksum a 0.
+def transportHeader(rng, family, payloadLen):
+	kind = rng.integers(3)
+	sport, dport = (int(port) for port in rng.integers(1, 65536, 2))
+	if kind == 0:
+		return 6, struct.pack("!HHIIBBHHH", sport, dport, int(rng.integers(1 << 32)), 0, 5 << 4, 0x18, 65535, 0, 0)
+	if kind == 1:
+		return 17, struct.pack("!HHHH", sport, dport, 8 + payloadLen, 0)
+	return (58, struct.pack("!BBHHH", 128, 0, 0, sport, dport)) if family == "ipv6" else \
+		(1, struct.pack("!BBHHH", 8, 0, 0, sport, dport))
+
+# Devuelve los bytes de un paquete sintético de la familia indicada.
+def syntheticFrame(rng, family):
+	payload = rng.bytes(int(rng.integers(0, 200)))
+	proto, l4 = transportHeader(rng, family, len(payload))
+	if family == "ipv4":
+		ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(l4) + len(payload), int(rng.integers(65536)),
+			0x4000, 64, proto, 0, rng.bytes(4), rng.bytes(4))
+		return ethernetHeader(rng, 0x0800) + ip + l4 + payload
+	ip = struct.pack("!IHBB16s16s", 6 << 28, len(l4) + len(payload), proto, 64, rng.bytes(16), rng.bytes(16))
+	return ethernetHeader(rng, 0x86dd) + ip + l4 + payload
+
+# Escribe la captura sintética "buena" (un paquete cada milisegundo).
+def generateGoodPcap(pcapFile, family, packets, seed):
+	rng = np.random.default_rng([seed, list(FEATURES).index(family)])
+	with open(pcapFile, "wb") as f:
+		rpcap.writePcapHeader(f, ipv4.LINKTYPE_ETHERNET)
+		for i in range(packets):
+			data = syntheticFrame(rng, family)
+			frame = rpcap.Frame(i + 1, ipv4.LINKTYPE_ETHERNET, i // 1000, i % 1000 * 1000, 1000000, data, len(data))
+			rpcap.writePcapRecord(f, frame, data)
+
+# Genera la captura anómala con los generadores del repositorio.
+def generateBadPcap(goodPcap, badPcap, family, seed):
+	if family == "ipv4":
+		ipv4.swapFieldsRaw(goodPcap, badPcap, ["ether", "ip"])
+	else:
+		ipv6.generateAttack(goodPcap, badPcap, "NS", seed=seed)
+
+# Devuelve los filtros de rango de paquetes del training, validation y test
+# set (60/20/20), con la sintaxis de fromPcapToTxt.sh.
+def splitRanges(packets):
+	train, val = packets * 6 // 10, packets * 8 // 10
+	return {"Train": "frame.number <= " + str(train),
+		"Val": "frame.number > " + str(train) + " && frame.number <= " + str(val),
+		"Test": "frame.number > " + str(val)}
+
+# Extrae los bytes de los paquetes de [pcapFile] a [txtFile]: con
+# fromPcapToTxt.sh si está tshark y, si no, con el mismo formato (un paquete
+# por línea, bytes en hexadecimal separados por espacios) desde Python.
+def pcapToTxt(pcapFile, packetsRange, txtFile):
+	if shutil.which("tshark"):
+		script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fromPcapToTxt.sh")
+		subprocess.run(["sh", script, pcapFile, packetsRange, txtFile], check=True)
+		return
+	with open(txtFile, "w") as f:
+		f.write("\n".join(frame.data.hex(" ") for frame in rpcap.iterCapture(pcapFile, packetsRange)))
+
+# Extrae a .txt el training, validation y test set de las dos capturas.
+def extractTxt(goodPcap, badPcap, packets, datasetTxt):
+	for part, packetsRange in splitRanges(packets).items():
+		pcapToTxt(goodPcap, packetsRange, datasetTxt.get("goodX" + part + "Txt"))
+		pcapToTxt(badPcap, packetsRange, datasetTxt.get("badX" + part + "Txt"))
+
+# Extrae las dos capturas a .npy (como fromPcapToNpy.py).
+def extractNpy(goodPcap, badPcap, numFeatures):
+	for pcapFile in [goodPcap, badPcap]:
+		np.save(os.path.splitext(pcapFile)[0] + ".npy", rpcap.extractFeatures(pcapFile, numFeatures))
+
+# Ejecuta un paso y guarda su tiempo, paquetes/s, MB/s de [inputFiles], pico
+# de memoria y memoria añadida (pico menos la memoria al empezar). La salida
+# del paso (progreso, Keras...) no se muestra.
+def runStage(results, name, packets, inputFiles, function, *args):
+	inputBytes = sum(os.path.getsize(path) for path in inputFiles)
+	prof.resetPeakMemory()
+	startMemory = prof.peakMemory()				# Tras reiniciarlo, el pico es la memoria actual.
+	with contextlib.redirect_stdout(io.StringIO()):
+		start = time.perf_counter()
+		value = function(*args)
+		elapsed = time.perf_counter() - start
+	peak = prof.peakMemory()
+	results.append({"stage": name, "seconds": round(elapsed, 4), "packets": packets,
+		"packetsPerSecond": round(packets / max(elapsed, 1e-9), 1), "inputMB": round(inputBytes / 1e6, 3),
+		"mbPerSecond": round(inputBytes / 1e6 / max(elapsed, 1e-9), 3), "peakRssMB": round(peak, 1),
+		"addedRssMB": round(peak - startMemory, 1)})
+	print("  " + name.ljust(28) + "%9.3f s" % elapsed + "%12.0f paq/s" % (packets / max(elapsed, 1e-9)) +
+		"%10.2f MB/s" % (inputBytes / 1e6 / max(elapsed, 1e-9)) + "%9.0f MB" % peak +
+		"%+9.0f MB" % (peak - startMemory), flush=True)
+	return value
+
+# Mide todos los pasos con una familia (IPv4 o IPv6).
+def benchmarkFamily(results, family, packets, epochs, seed, workDir):
+	numFeatures = FEATURES.get(family)
+	goodPcap = os.path.join(workDir, "cap-" + family + ".pcap")
+	badPcap = os.path.join(workDir, "cap-" + family + "-bad.pcap")
+	print("[" + family + "]")
+	runStage(results, family + " generar captura", packets, [], generateGoodPcap, goodPcap, family, packets, seed)
+	runStage(results, family + " generar anómala", packets, [goodPcap], generateBadPcap, goodPcap, badPcap, family, seed)
+
+	datasetTxt = {}
+	for part in splitRanges(packets):
+		for kind in ["good", "bad"]:
+			datasetTxt[kind + "X" + part + "Txt"] = os.path.join(workDir, family + "-" + kind + "-" + part + ".txt")
+	runStage(results, family + " pcap -> txt", 2 * packets, [goodPcap, badPcap], extractTxt,
+		goodPcap, badPcap, packets, datasetTxt)
+	runStage(results, family + " pcap -> npy", 2 * packets, [goodPcap, badPcap], extractNpy,
+		goodPcap, badPcap, numFeatures)
+
+	options = {"cache": "", "cacheSize": "0", "stream": "0", "buffer": "0"}
+	dataset = runStage(results, family + " createDataset", 2 * packets, list(datasetTxt.values()),
+		nn.generateDataset, datasetTxt, numFeatures, options)
+	model = nn.buildNN(numFeatures)
+	runStage(results, family + " trainNN", epochs * dataset.get("trainRows"), [], nn.trainNN, model, dataset,
+		numFeatures, None, epochs)
+	runStage(results, family + " testNN", len(dataset.get("test").packetDataset), [], nn.testNN, model, dataset)
+
+# Devuelve el commit de git del código (None si no está en un repositorio).
+def gitVersion():
+	try:
+		return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+			cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+options = checkExecution()
+packets, epochs, seed = int(options.get("packets")), int(options.get("epochs")), int(options.get("seed"))
+workDir = options.get("dir") or tempfile.mkdtemp(prefix="benchmark-tfg-")
+os.makedirs(workDir, exist_ok=True)
+results = []
+print("  " + "paso".ljust(28) + "%11s" % "tiempo" + "%17s" % "paquetes/s" + "%15s" % "MB/s" + "%12s" % "pico RSS" + "%12s" % "añadida")
+try:
+	for family in options.get("family").split(","):
+		benchmarkFamily(results, family, packets, epochs, seed, workDir)
+finally:
+	if not options.get("dir"):
+		shutil.rmtree(workDir, ignore_errors=True)
+
+report = {"version": gitVersion(), "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+	"python": platform.python_version(), "numpy": np.__version__, "keras": keras.__version__,
+	"machine": platform.machine(), "cpus": os.cpu_count(), "tshark": shutil.which("tshark") is not None,
+	"config": {"packets": packets, "family": options.get("family"), "epochs": epochs, "seed": seed},
+	"stages": results}
+with open(options.get("output"), "w") as f:
+	json.dump(report, f, indent=4, ensure_ascii=False)
+print("· Resultados en " + options.get("output"))
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa auxiliar con una caché en disco de los paquetes ya leídos de los
+# ficheros .txt, para no tener que volver a decodificar el texto en cada
+# ejecución de NNForNetworkTraffic.py.
+#
+# Cada entrada es un fichero .npy con la matriz uint8 (paquetes x numFeatures)
+# de un fichero .txt, identificada por (ruta, fecha de modificación, tamaño,
+# numFeatures). Si el .txt cambia, su entrada antigua se descarta y se vuelve a
+# generar. Las etiquetas no se guardan: dependen solo de si el fichero es de
+# tráfico "bueno" (y = 0) o "malo" (y = 1).
+#
+# Las entradas se abren con np.load(mmap_mode="r"), de modo que el sistema
+# operativo solo carga en memoria las páginas que se usan. Cuando la caché
+# supera [maxBytes] se borran las entradas usadas hace más tiempo.
+
+# ENTRADAS:
+# filepath => fichero .txt con los bytes de los paquetes.
+# numFeatures => número de bytes que caracterizan a cada uno de los paquetes.
+# loader => función que lee el fichero .txt si no está en la caché.
+# cacheDir => directorio donde se guardan las entradas de la caché.
+# maxBytes => tamaño máximo que puede ocupar la caché.
+
+# SALIDAS:
+# Devuelve la matriz uint8 (mapeada en memoria) con los bytes de los paquetes.
+
+# EJEMPLO DE EJECUCIÓN:
+# import datasetCache as cache
+# cache.loadCached("cap-ipv6-train.txt", 88, rtxt.loadTxtFile, cache.DIR_CACHE, cache.TAM_CACHE)
+###############################################################################
+
+import numpy as np
+import hashlib
+import os
+
+DIR_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "TFG")
+TAM_CACHE = 4 << 30		# 4 GiB.
+
+# Devuelve el resumen (hexadecimal) de una cadena.
+def digest(text):
+	return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+# Devuelve el nombre de la entrada de la caché para un fichero: la primera
+# parte identifica la ruta y [numFeatures], y la segunda la versión actual del
+# fichero (mtime y tamaño).
+def entryName(filepath, numFeatures):
+	path = os.path.abspath(filepath)
+	st = os.stat(path)
+	pathId = digest(path + "|" + str(numFeatures))
+	keyId = digest(path + "|" + str(st.st_mtime_ns) + "|" + str(st.st_size) + "|" + str(numFeatures))
+	return pathId, pathId + "-" + keyId + ".npy"
+
+# Borra las entradas antiguas de un fichero (misma ruta y numFeatures, otra
+# versión) salvo [keep]. Las de otro numFeatures siguen siendo válidas.
+def removeStale(cacheDir, pathId, keep):
+	for name in os.listdir(cacheDir):
+		if name.startswith(pathId + "-") and name != keep:
+			removeEntry(os.path.join(cacheDir, name))
+
+# Borra una entrada de la caché (si otro proceso ya la ha borrado, no pasa nada).
+def removeEntry(entry):
+	try:
+		os.remove(entry)
+	except FileNotFoundError:
+		pass
+
+# Borra las entradas usadas hace más tiempo hasta que la caché ocupa como
+# mucho [maxBytes] (nunca borra [keep]).
+def evict(cacheDir, maxBytes, keep):
+	entries = []
+	for name in os.listdir(cacheDir):
+		if name.endswith(".npy"):
+			st = os.stat(os.path.join(cacheDir, name))
+			entries.append((st.st_mtime, st.st_size, name))
+	entries.sort()
+	total = sum(size for _, size, _ in entries)
+	for _, size, name in entries:
+		if total <= maxBytes:
+			break
+		if name != keep:
+			removeEntry(os.path.join(cacheDir, name))
+			total -= size
+
+# Devuelve la matriz uint8 (mapeada en memoria) de un fichero .txt si ya está
+# en la caché y al día, o None si no está.
+def findCached(filepath, numFeatures, cacheDir=DIR_CACHE):
+	entry = os.path.join(cacheDir, entryName(filepath, numFeatures)[1])
+	if os.path.exists(entry):
+		try:
+			data = np.load(entry, mmap_mode="r")
+			os.utime(entry)									# Marcamos la entrada como usada (orden LRU).
+			return data
+		except (OSError, ValueError):
+			removeEntry(entry)								# Entrada corrupta: se regenera.
+	return None
+
+# Devuelve la matriz uint8 de un fichero .txt desde la caché, o la lee con
+# [loader] y la guarda en la caché si no estaba (o estaba desactualizada).
+def loadCached(filepath, numFeatures, loader, cacheDir=DIR_CACHE, maxBytes=TAM_CACHE):
+	data = findCached(filepath, numFeatures, cacheDir)
+	if data is not None:
+		print("· " + filepath + ": " + str(len(data)) + " paquetes (caché)")
+		return data
+
+	pathId, name = entryName(filepath, numFeatures)
+	entry = os.path.join(cacheDir, name)
+	data = loader(filepath, numFeatures)
+	if data.nbytes > maxBytes:
+		return data											# No cabe en la caché.
+	os.makedirs(cacheDir, exist_ok=True)
+	removeStale(cacheDir, pathId, name)
+
+	# Se escribe en un fichero temporal y se renombra, para que otro proceso
+	# nunca vea una entrada a medio escribir.
+	tmp = entry + ".tmp-" + str(os.getpid())
+	with open(tmp, "wb") as f:
+		np.save(f, np.ascontiguousarray(data, dtype=np.uint8))
+	os.replace(tmp, entry)
+	evict(cacheDir, maxBytes, name)
+	return np.load(entry, mmap_mode="r")
@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa auxiliar para evaluar la red neuronal lote a lote: con cada lote de
+# predicciones se actualizan la matriz de confusión y dos histogramas de
+# puntuaciones (uno para el tráfico "bueno" y otro para el anómalo), en una
+# sola pasada y sin guardar las predicciones. Así se puede evaluar un test set
+# que no cabe en memoria.
+#
+# Con la matriz de confusión se calculan la exactitud, la precisión, el recall
+# y el F1 del tráfico anómalo (clase positiva, y = 1); con los histogramas, el
+# área bajo las curvas ROC y precisión-recall (con una resolución de 1 / [bins]
+# en la puntuación).
+
+# ENTRADAS:
+# yTrue => etiquetas de cada lote (0 = tráfico "bueno", 1 = anómalo).
+# scores => puntuaciones (0-1) que da la red neuronal a cada paquete del lote.
+# threshold => (opcional) un paquete se clasifica como anómalo si su
+#			   puntuación es mayor que [threshold] (0.5, como np.around()).
+# bins => (opcional) número de intervalos de los histogramas (1000).
+
+# SALIDAS:
+# Diccionario con la matriz de confusión ([[VN, FP], [FN, VP]]), la
+# exactitud, la precisión, el recall, el F1 y las áreas bajo las curvas ROC
+# y PR.
+
+# EJEMPLO DE EJECUCIÓN:
+# import evaluationMetrics as em
+# metrics = em.newMetrics()
+# for yTest, scores in batches:
+#	em.updateMetrics(metrics, yTest, scores)
+# summary = em.summarizeMetrics(metrics)
+###############################################################################
+
+import numpy as np
+
+NUM_INTERVALOS = 1000		# Intervalos de los histogramas de puntuaciones.
+
+# Devuelve las métricas vacías, antes de procesar ningún lote.
+def newMetrics(threshold=0.5, bins=NUM_INTERVALOS):
+	return {"threshold": threshold, "confusion": np.zeros((2, 2), dtype=np.int64),
+		"histograms": np.zeros((2, bins), dtype=np.int64)}
+
+# Actualiza las métricas con un lote de etiquetas y puntuaciones.
+def updateMetrics(metrics, yTrue, scores):
+	yTrue = np.reshape(yTrue, -1).astype(np.int64)
+	scores = np.reshape(scores, -1)
+	yPred = (scores > metrics["threshold"]).astype(np.int64)
+	metrics["confusion"] += np.bincount(2 * yTrue + yPred, minlength=4).reshape(2, 2)
+	histograms = metrics["histograms"]
+	bins = histograms.shape[1]
+	binIndex = np.clip((scores * bins).astype(np.int64), 0, bins - 1)
+	histograms += np.bincount(bins * yTrue + binIndex, minlength=2 * bins).reshape(2, bins)
+
+# Divide sin dar error si el denominador es 0 (entonces devuelve 0).
+def safeDivide(a, b):
+	return a / b if b else 0.0
+
+# Devuelve el área bajo las curvas ROC y PR a partir de los histogramas,
+# recorriendo los umbrales de mayor a menor puntuación.
+def areasUnderCurves(histograms):
+	tp = np.concatenate([[0], np.cumsum(histograms[1][::-1])])
+	fp = np.concatenate([[0], np.cumsum(histograms[0][::-1])])
+	positives, negatives = tp[-1], fp[-1]
+	if not positives or not negatives:
+		return 0.0, 0.0
+	tpr, fpr = tp / positives, fp / negatives
+	rocAuc = float(np.sum((fpr[1:] - fpr[:-1]) * (tpr[1:] + tpr[:-1]) / 2))
+	precision = tp[1:] / np.maximum(tp[1:] + fp[1:], 1)
+	prAuc = float(np.sum((tpr[1:] - tpr[:-1]) * precision))		# Precisión media.
+	return min(rocAuc, 1.0), min(prAuc, 1.0)		# El redondeo puede pasar de 1.
+
+# Devuelve el resumen de las métricas de todos los lotes procesados.
+def summarizeMetrics(metrics):
+	(tn, fp), (fn, tp) = metrics["confusion"].tolist()
+	total = tn + fp + fn + tp
+	precision = safeDivide(tp, tp + fp)
+	recall = safeDivide(tp, tp + fn)
+	rocAuc, prAuc = areasUnderCurves(metrics["histograms"])
+	return {"confusion": metrics["confusion"], "accuracy": safeDivide(tp + tn, total),
+		"inaccuracy": safeDivide(fp + fn, total), "precision": precision, "recall": recall,
+		"f1": safeDivide(2 * precision * recall, precision + recall), "rocAuc": rocAuc, "prAuc": prAuc}
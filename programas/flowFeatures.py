@@ -0,0 +1,237 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa que extrae de una captura, además de los [numFeatures] primeros
+# bytes de cada paquete (como fromPcapToNpy.py), unas estadísticas del flujo
+# al que pertenece, calculadas con los paquetes del flujo vistos hasta ese
+# momento. Los ataques de los generadores (direcciones intercambiadas,
+# NS/NA/RA con MACs falsas) se notan mucho más a nivel de flujo que en los
+# bytes de un paquete suelto.
+#
+# Los flujos se identifican por su 5-tupla (IP origen y destino, protocolo y
+# puertos, en los dos sentidos) o, en los mensajes ND de ICMPv6, por la IP origen y
+# la dirección objetivo (target). Se guardan en un índice hash que se
+# actualiza en una sola pasada sobre la captura; los flujos que llevan más de
+# [idle] segundos sin paquetes (según el tiempo de la captura) se descartan,
+# y si aun así hay más de [maxFlows], se descartan los menos recientes. Así,
+# la memoria no depende del tamaño de la captura.
+#
+# Las estadísticas se guardan como bytes (0-255) detrás de los del paquete,
+# de modo que el resultado se usa igual que un .npy de fromPcapToNpy.py con
+# numFeatures + FLOW_FEATURES bytes por paquete:
+#	1. Paquetes del flujo (escala logarítmica).
+#	2. Bytes del flujo (escala logarítmica).
+#	3. Tiempo desde el paquete anterior del flujo (escala logarítmica, en us).
+#	4. Media móvil de ese tiempo.
+#	5. Sentido del paquete (0 el del primer paquete del flujo, 255 el contrario).
+#	6. Proporción de paquetes del flujo en el primer sentido.
+#	7. Antigüedad del flujo (escala logarítmica, en us).
+#	8. 255 si la MAC origen cambia respecto al paquete anterior del mismo
+#	   sentido del flujo (o, en ND, si la MAC anunciada no es la MAC origen).
+
+# ENTRADAS:
+# [inputFile.pcap] => captura (.pcap o .pcapng) donde se encuentran los paquetes.
+# [filterByPacketsRange] => rango de paquetes (como en fromPcapToNpy.py). Los
+#							flujos se calculan con todos los paquetes
+#							anteriores, aunque no estén en el rango.
+# [numFeatures] => número de bytes de cada paquete.
+# [idle] => (opcional) segundos sin paquetes tras los que se olvida un flujo (120).
+# [maxFlows] => (opcional) flujos que se guardan como mucho (1000000).
+
+# SALIDAS:
+# [outputFile.npy] => matriz uint8 (paquetes x (numFeatures + FLOW_FEATURES)).
+
+# EJEMPLO DE EJECUCIÓN:
+# python3 flowFeatures.py captura.pcap "frame.number <= 1000" captura-train-flujos.npy 88 [idle=120] [maxFlows=1000000]
+###############################################################################
+
+import readPcapFile as rpcap
+import splitDataset as split
+import numpy as np
+import collections
+import struct
+import math
+import time
+import sys
+
+FLOW_FEATURES = 8			# Bytes de estadísticas de flujo por paquete.
+TIEMPO_INACTIVO = 120		# Segundos sin paquetes tras los que se olvida un flujo.
+MAX_FLUJOS = 1 << 20		# Flujos que se guardan como mucho.
+TAM_BLOQUE = 1 << 14		# Paquetes por bloque.
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+
+# Cabeceras de extensión de IPv6 que se saltan para llegar al nivel de transporte.
+IPV6_EXTENSIONS = (0, 43, 60)
+
+# Mensajes ND de ICMPv6 (RS, RA, NS, NA, redirect) y posición de sus opciones.
+ND_OPTIONS = {133: 8, 134: 16, 135: 24, 136: 24, 137: 40}
+
+# Comprueba si se ha ejecutado bien el programa. Si está bien ejecutado,
+# devuelve [inputFile.pcap], [filterByPacketsRange], [outputFile.npy],
+# [numFeatures] y las opciones que se hayan indicado detrás.
+def checkExecution():
+	options = {"idle": str(TIEMPO_INACTIVO), "maxFlows": str(MAX_FLUJOS)}
+	optionsArgv = [arg.split("=")[0] for arg in sys.argv[5:]]
+	if len(sys.argv) < 5 or not sys.argv[4].isdigit() or not all(key in options for key in optionsArgv):
+		print("usage: python3 flowFeatures.py [inputFile.pcap] [filterByPacketsRange] " +
+			"[outputFile.npy] [numFeatures] [idle=[s]] [maxFlows=[N]]")
+		sys.exit(1)
+	for arg in sys.argv[5:]:
+		key, value = arg.split("=", 1)
+		options[key] = value
+	return sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4]), options
+
+# Devuelve la MAC origen (None si no es Ethernet) y la posición y versión de
+# la cabecera IP de una trama (None si no tiene nivel IP).
+def findIP(linktype, data):
+	if linktype == LINKTYPE_ETHERNET:
+		offset = 12
+		etherType = None
+		while offset + 2 <= len(data):
+			etherType = struct.unpack_from("!H", data, offset)[0]
+			if etherType not in (0x8100, 0x88a8):			# VLAN.
+				break
+			offset += 4
+		version = {0x0800: 4, 0x86dd: 6}.get(etherType)
+		return data[6:12], (offset + 2, version) if version else None
+	if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6) and data:
+		version = data[0] >> 4
+		return None, (0, version) if version in (4, 6) else None
+	return None, None
+
+# Devuelve la clave del flujo de una trama (sin sentido: las dos puntas
+# ordenadas), el sentido del paquete (0 o 1) y, en ND, la MAC que anuncia.
+def flowKey(linktype, data):
+	mac, ip = findIP(linktype, data)
+	if ip is None:
+		if mac is None:
+			return ("otro", linktype), 0, None
+		a, b = data[6:12], data[0:6]
+		return ("eth", min(a, b), max(a, b), data[12:14]), int(a > b), None
+	offset, version = ip
+	if version == 4:
+		if len(data) < offset + 20:
+			return ("ipv4",), 0, None
+		proto = data[offset + 9]
+		src, dst = data[offset + 12:offset + 16], data[offset + 16:offset + 20]
+		l4 = offset + (data[offset] & 0x0f) * 4
+	else:
+		if len(data) < offset + 40:
+			return ("ipv6",), 0, None
+		proto = data[offset + 6]
+		src, dst = data[offset + 8:offset + 24], data[offset + 24:offset + 40]
+		l4 = offset + 40
+		while proto in IPV6_EXTENSIONS and len(data) >= l4 + 8:
+			proto, l4 = data[l4], l4 + (data[l4 + 1] + 1) * 8
+	announced = None
+	if proto in (6, 17) and len(data) >= l4 + 4:
+		sport, dport = data[l4:l4 + 2], data[l4 + 2:l4 + 4]
+	elif proto == 58 and len(data) >= l4 + 1 and data[l4] in ND_OPTIONS:
+		# ND: el flujo es el de la dirección objetivo (NS, NA, redirect) o el
+		# del router (RS, RA). La MAC anunciada va en la opción 1 o 2.
+		icmpType = data[l4]
+		target = data[l4 + 8:l4 + 24] if icmpType in (135, 136, 137) else b""
+		option = l4 + ND_OPTIONS[icmpType]
+		while option + 8 <= len(data) and data[option + 1]:
+			if data[option] in (1, 2):
+				announced = data[option + 2:option + 8]
+				break
+			option += data[option + 1] * 8
+		return ("nd", src, target), 0, announced
+	else:
+		sport, dport = b"", b""
+	a, b = src + sport, dst + dport
+	return (proto, min(a, b), max(a, b)), int(a > b), announced
+
+# Devuelve un valor en escala logarítmica (0-255): [scale] unidades por cada
+# potencia de 2.
+def logByte(value, scale):
+	return min(255, int(scale * math.log2(1 + max(value, 0))))
+
+# Índice de flujos: para cada clave, las estadísticas del flujo hasta ahora.
+# Está ordenado del flujo usado hace más tiempo al más reciente, para poder
+# descartar los inactivos y los que sobran sin recorrerlo entero.
+class FlowIndex:
+	def __init__(self, idle=TIEMPO_INACTIVO, maxFlows=MAX_FLUJOS):
+		self.idle = idle
+		self.maxFlows = maxFlows
+		self.flows = collections.OrderedDict()
+		self.evicted = 0
+
+	# Descarta los flujos inactivos en el instante [now] y los que sobran.
+	def evict(self, now):
+		while self.flows:
+			key, flow = next(iter(self.flows.items()))
+			if now - flow["last"] <= self.idle and len(self.flows) < self.maxFlows:
+				break
+			del self.flows[key]
+			self.evicted += 1
+
+	# Añade una trama a su flujo y devuelve las estadísticas del flujo (bytes).
+	def update(self, frame):
+		now = frame.seconds + frame.fraction / frame.resolution
+		key, side, announced = flowKey(frame.linktype, frame.data)
+		flow = self.flows.get(key)
+		if flow is None:
+			self.evict(now)
+			flow = {"first": now, "last": now, "firstSide": side, "packets": 0, "bytes": 0, "forward": 0,
+				"iat": 0.0, "macs": [None, None]}
+			self.flows[key] = flow
+		else:
+			self.flows.move_to_end(key)
+		direction = int(side != flow["firstSide"])
+		iat = (now - flow["last"]) * 1e6
+		flow["iat"] = iat if flow["packets"] == 1 else 0.875 * flow["iat"] + 0.125 * iat
+		flow["last"] = now
+		flow["packets"] += 1
+		flow["bytes"] += frame.wirelen
+		flow["forward"] += 1 - direction
+		mac = frame.data[6:12] if frame.linktype == LINKTYPE_ETHERNET else None
+		changed = mac is not None and ((flow["macs"][direction] not in (None, mac)) or
+			(announced is not None and announced != mac))
+		flow["macs"][direction] = mac
+		return bytes([logByte(flow["packets"], 16), logByte(flow["bytes"], 8),
+			logByte(iat if flow["packets"] > 1 else 0, 7), logByte(flow["iat"], 7), 255 * direction,
+			255 * flow["forward"] // flow["packets"], logByte((now - flow["first"]) * 1e6, 7), 255 * changed])
+
+# Recorre por bloques (matrices uint8 de hasta [blockRows] paquetes) los
+# [numFeatures] primeros bytes de cada paquete seguidos de las estadísticas de
+# su flujo. Los flujos se actualizan con todas las tramas, aunque solo se
+# devuelvan las del rango [packetsRange].
+def iterFlowFeatureBlocks(pcapFile, numFeatures, packetsRange=None, blockRows=TAM_BLOQUE,
+		idle=TIEMPO_INACTIVO, maxFlows=MAX_FLUJOS, index=None):
+	first, last = rpcap.parsePacketsRange(packetsRange)
+	index = index if index is not None else FlowIndex(idle, maxFlows)
+	rows = []
+	for frame in rpcap.iterCapture(pcapFile, None if last is None else "frame.number <= " + str(last)):
+		stats = index.update(frame)
+		if frame.number >= first:
+			rows.append(frame.data[:numFeatures].ljust(numFeatures, b"\0") + stats)
+			if len(rows) == blockRows:
+				yield np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(-1, numFeatures + FLOW_FEATURES)
+				rows = []
+	if rows:
+		yield np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(-1, numFeatures + FLOW_FEATURES)
+
+if __name__ == "__main__":
+	inputFile, packetsRange, outputFile, numFeatures, options = checkExecution()
+	start = time.perf_counter()
+	index = FlowIndex(float(options.get("idle")), int(options.get("maxFlows")))
+	writer = split.NpyWriter(outputFile, numFeatures + FLOW_FEATURES)
+	try:
+		for block in iterFlowFeatureBlocks(inputFile, numFeatures, packetsRange, index=index):
+			writer.write(block)
+	except (ValueError, rpcap.PcapError) as e:
+		print("Error: " + str(e))
+		sys.exit(1)
+	finally:
+		writer.close()
+	elapsed = max(time.perf_counter() - start, 1e-9)
+	print("· " + outputFile + ": " + str(writer.rows) + " paquetes en " + "%.2f" % elapsed + " s (" +
+		"%.0f" % (writer.rows / elapsed) + " paquetes/s), " + str(len(index.flows)) + " flujos activos, " +
+		str(index.evicted) + " descartados")
+	print("· Para entrenar la red neuronal con este fichero: features=" + str(numFeatures + FLOW_FEATURES))
@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa que se encarga de extraer en la captura [inputFile.pcap] los
+# [numFeatures] primeros bytes de los paquetes indicados en
+# [filterByPacketsRange]. La extracción se lleva al fichero [outputFile.npy]
+# como una matriz uint8 (un paquete por fila).
+#
+# Hace lo mismo que fromPcapToTxt.sh, pero leyendo la captura directamente
+# (ver readPcapFile.py), sin tshark ni el volcado hexadecimal intermedio. El
+# fichero .npy se puede pasar a NNForNetworkTraffic.py en lugar del .txt.
+
+# ENTRADAS:
+# [inputFile.pcap] => captura (.pcap o .pcapng) donde se encuentran los paquetes.
+# [filterByPacketsRange] => rango de paquetes en el cual queremos extraer los
+#							bytes ("frame.number <= 1000", "frame.number > 1000
+#							&& frame.number <= 2000"...). Vacío para todos.
+# [numFeatures] => número de bytes que caracterizan a cada uno de los paquetes.
+
+# SALIDAS:
+# [outputFile.npy] => fichero .npy a donde se lleva la extracción.
+
+# EJEMPLO DE EJECUCIÓN:
+# python3 fromPcapToNpy.py captura.pcap "frame.number <= 1000" captura-train.npy 50
+###############################################################################
+
+import readPcapFile as rpcap
+import numpy as np
+import time
+import sys
+
+# Comprueba si se ha ejecutado bien el programa. Si está bien ejecutado,
+# devuelve [inputFile.pcap], [filterByPacketsRange], [outputFile.npy] y [numFeatures].
+def checkExecution():
+	if len(sys.argv) != 5 or not sys.argv[4].isdigit():
+		print("usage: python3 fromPcapToNpy.py [inputFile.pcap] [filterByPacketsRange] " +
+			"[outputFile.npy] [numFeatures]")
+		sys.exit(1)
+	return sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+
+inputFile, packetsRange, outputFile, numFeatures = checkExecution()
+start = time.perf_counter()
+try:
+	data = rpcap.extractFeatures(inputFile, numFeatures, packetsRange)
+except (ValueError, rpcap.PcapError) as e:
+	print("Error: " + str(e))
+	sys.exit(1)
+np.save(outputFile, data)
+elapsed = max(time.perf_counter() - start, 1e-9)
+print("· " + outputFile + ": " + str(len(data)) + " paquetes en " + "%.2f" % elapsed +
+	" s (" + "%.0f" % (len(data) / elapsed) + " paquetes/s)")
@@ -12,25 +12,72 @@
 # goodPcap => captura de tráfico original (con el tráfico "bueno").
 # badPcap => captura de tráfico que queremos que albergue el tráfico modificado
 #			 (el tráfico "malo").
+# engine => (opcional) cómo se generan los paquetes: "raw" (por defecto,
+#			 intercambiando los bytes directamente), "scapy" (diseccionando
+#			 cada paquete) o "bench" (los dos, comparando resultado y velocidad).
+# batch => (opcional) opciones del menú que se generan a la vez, sin
+#			preguntar ("1,2,5" o "all" para las seis), leyendo la captura
+#			original una sola vez.
 
 # SALIDAS:
 # 1. La captura de tráfico con las modificaciones hechas en base a la original
-# (badPcap con el tráfico sospechoso).
+# (badPcap con el tráfico sospechoso). En el modo batch, una captura por
+# opción con el sufijo de su variante (Eth, IP, EthIP, Ports, IPPorts o
+# EthIPPorts): captura-mala.pcap -> captura-mala-IP.pcap...
 
 # EJEMPLO DE EJECUCIÓN:
-# python3 generateBadIPv4Pcap.py captura-buena.pcap captura-mala-IP.pcap
+# python3 generateBadIPv4Pcap.py captura-buena.pcap captura-mala-IP.pcap [engine=raw]
+# python3 generateBadIPv4Pcap.py captura-buena.pcap captura-mala.pcap batch=all
 ##############################################################################
 
 from scapy.all import *
+import readPcapFile as rpcap
+import stageProfiler as prof
+import time
+import sys
+import os
+
+PROGRESO = 10000		# Cada cuántos paquetes se muestra el progreso.
+
+# Valores de las cabeceras que se reconocen sin Scapy.
+LINKTYPE_ETHERNET = 1
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86dd
+ETHERTYPE_ARP = 0x0806
+ETHERTYPES_VLAN = (0x8100, 0x88a8)				# 802.1Q y 802.1ad.
+PROTO_TCP = 6
+PROTO_UDP = 17
+IPV6_FRAGMENT = 44
+IPV6_EXTENSIONS = (0, 43, 44, 60)				# Hop-by-hop, routing, fragment y destination.
+IPV6_OTHER_EXTENSIONS = (135, 139, 140)			# Mobility, HIP y shim6.
+PROTOS_TUNEL = (4, 41, 47, 50, 51)				# IP en IP, IPv6 en IP, GRE, ESP y AH.
+# Puertos UDP en los que Scapy diseccionaría otro paquete dentro (VXLAN, L2TP, GRE...).
+PUERTOS_TUNEL_UDP = (434, 1701, 4500, 4754, 4789, 4790, 6633, 8472, 48879)
 
 # Comprueba si se ha ejecutado bien el programa. Si está bien ejecutado, devuelve [goodPcap] y [badPcap].
+# También devuelve el método con el que se generan los paquetes ([engine]):
+# "raw" (por defecto), "scapy" o "bench" (los dos, comparándolos), y las
+# opciones del menú que se generan a la vez en el modo batch ([batch], None si
+# se pregunta por el menú).
 def checkExecution():
-	if len(sys.argv) != 3:
-		print("usage: python3 generateBadIPv4Pcap.py [goodPcap] [badPcap]")
+	options = {"engine": "raw", "batch": None}
+	for arg in sys.argv[3:]:
+		key, _, value = arg.partition("=")
+		if key not in options:
+			options = None
+			break
+		options[key] = value
+	batch = options and options["batch"]
+	if batch is not None:
+		batch = list(VARIANTS) if batch == "all" else batch.split(",")
+	if len(sys.argv) < 3 or options is None or options["engine"] not in ("raw", "scapy", "bench") or \
+			(batch is not None and (options["engine"] == "bench" or not set(batch) <= set(VARIANTS))):
+		print("usage: python3 generateBadIPv4Pcap.py [goodPcap] [badPcap] [engine=raw|scapy|bench] " +
+			"[batch=1,2,...|all]")
 		sys.exit()
 	goodPcap = sys.argv[1]
 	badPcap = sys.argv[2]
-	return goodPcap, badPcap
+	return goodPcap, badPcap, options["engine"], batch
 
 # Muestra al usuario un menú para que elija cómo quiere generar la nueva captura.
 def showMenu():
@@ -52,110 +99,400 @@ def getOption():
 	num = input("Su opción es: ")
 	return num
 
-# Genera una nueva captura intercambiando las direcciones Ethernet.
-def exchangeEthernetDirs(goodPcap, badPcap):
-	packets = rdpcap(goodPcap)
-	for packet in packets:
+# Intercambia las direcciones Ethernet de un paquete.
+def swapEthernetDirs(packet):
+	if Ether in packet:
 		EtherSrc = packet[Ether].src
 		packet[Ether].src = packet[Ether].dst
 		packet[Ether].dst = EtherSrc
-	wrpcap(badPcap, packets)
+
+# Intercambia las direcciones IP de un paquete.
+def swapIPDirs(packet):
+	if IP in packet:					# No todos los paquetes pasan por el nivel IP (ARP por ejemplo)
+		IPSrc = packet[IP].src
+		packet[IP].src = packet[IP].dst
+		packet[IP].dst = IPSrc
+
+# Intercambia los puertos TCP/UDP de un paquete.
+def swapTCPUDPPorts(packet):
+	if TCP in packet:
+		TCPSPort = packet[TCP].sport
+		packet[TCP].sport = packet[TCP].dport
+		packet[TCP].dport = TCPSPort
+	if UDP in packet:
+		UDPSPort = packet[UDP].sport
+		packet[UDP].sport = packet[UDP].dport
+		packet[UDP].dport = UDPSPort
+
+# Intercambios de cada tipo de campo con Scapy.
+SCAPY_SWAPS = {"ether": swapEthernetDirs, "ip": swapIPDirs, "ports": swapTCPUDPPorts}
+
+# Muestra cuántos paquetes se llevan procesados y a qué velocidad.
+def showProgress(count, start, end="\r"):
+	elapsed = max(time.perf_counter() - start, 1e-9)
+	print("· " + str(count) + " paquetes (" + "%.0f" % (count / elapsed) + " paquetes/s)", end=end, flush=True)
+	return count / elapsed
+
+# Genera la nueva captura paquete a paquete (con memoria constante) con Scapy:
+# lee cada paquete de [goodPcap], le aplica los intercambios de [swaps] y lo
+# escribe en [badPcap].
+#
+# Los checksums se dejan como estaban: IP, TCP y UDP usan la suma en
+# complemento a uno de palabras de 16 bits (con las direcciones IP en la
+# pseudo-cabecera de TCP/UDP), que no cambia al intercambiar dos campos del
+# mismo tamaño. Así que siguen siendo correctos sin recalcularlos.
+@prof.stage("swapFieldsScapy")
+def swapFieldsScapy(goodPcap, badPcap, swaps):
+	start = time.perf_counter()
+	count = 0
+	writer = PcapWriter(badPcap)		# Como wrpcap(): tipo de enlace según el primer paquete.
+	with PcapReader(goodPcap) as reader:
+		for packet in reader:
+			for swap in swaps:
+				SCAPY_SWAPS[swap](packet)
+			writer.write(packet)
+			count += 1
+			if count % PROGRESO == 0:
+				showProgress(count, start)
+	writer.close()
+	prof.addRows(count)
+	return showProgress(count, start, end="\n")
+
+# Devuelve la posición de la cabecera IPv4 (None si no hay) y la de la
+# cabecera TCP/UDP (None si no hay) de una trama Ethernet, junto con la
+# posición del checksum TCP/UDP. Devuelve None si la trama no es de las que se
+# saben tratar sin Scapy (túneles, cabeceras cortadas o no soportadas...).
+def findOffsets(frame):
+	if len(frame) < 14:
+		return None
+	etherType = int.from_bytes(frame[12:14], "big")
+	offset = 14
+	while etherType in ETHERTYPES_VLAN:
+		if len(frame) < offset + 4:
+			return None
+		etherType = int.from_bytes(frame[offset + 2:offset + 4], "big")
+		offset += 4
+	if etherType == ETHERTYPE_ARP:
+		return None, None, None
+	if etherType == ETHERTYPE_IPV4:
+		return findIPv4Offsets(frame, offset)
+	if etherType == ETHERTYPE_IPV6:
+		return findIPv6Offsets(frame, offset)
+	return None
+
+# Como findOffsets(), a partir de una cabecera IPv4 en [offset].
+def findIPv4Offsets(frame, offset):
+	if len(frame) < offset + 20 or frame[offset] >> 4 != 4:
+		return None
+	headerLen = (frame[offset] & 15) * 4
+	totalLen = int.from_bytes(frame[offset + 2:offset + 4], "big")
+	if headerLen < 20 or totalLen < headerLen or len(frame) < offset + headerLen:
+		return None
+	fragment = int.from_bytes(frame[offset + 6:offset + 8], "big") & 0x1fff
+	proto = frame[offset + 9]
+	if proto in PROTOS_TUNEL:
+		return None
+	if fragment != 0 or proto not in (PROTO_TCP, PROTO_UDP):
+		return offset, None, None			# Sin cabecera TCP/UDP (Scapy la deja como Raw).
+	l4 = findL4Offset(frame, offset + headerLen, min(len(frame), offset + totalLen), proto)
+	return None if l4 is None else (offset, l4[0], l4[1])
+
+# Como findOffsets(), a partir de una cabecera IPv6 en [offset] (incluidas sus
+# cabeceras de extensión).
+def findIPv6Offsets(frame, offset):
+	if len(frame) < offset + 40 or frame[offset] >> 4 != 6:
+		return None
+	payloadLen = int.from_bytes(frame[offset + 4:offset + 6], "big")
+	nextHeader = frame[offset + 6]
+	end = min(len(frame), offset + 40 + payloadLen)
+	offset += 40
+	while nextHeader in IPV6_EXTENSIONS:
+		if end < offset + 8:
+			return None
+		if nextHeader == IPV6_FRAGMENT:
+			if int.from_bytes(frame[offset + 2:offset + 4], "big") >> 3 != 0:
+				return None, None, None		# Fragmento que no es el primero.
+			headerLen = 8
+		else:
+			headerLen = (frame[offset + 1] + 1) * 8
+		nextHeader = frame[offset]
+		offset += headerLen
+	if payloadLen == 0 or nextHeader in PROTOS_TUNEL or nextHeader in IPV6_OTHER_EXTENSIONS:
+		return None
+	if nextHeader not in (PROTO_TCP, PROTO_UDP):
+		return None, None, None
+	l4 = findL4Offset(frame, offset, end, nextHeader)
+	return None if l4 is None else (None, l4[0], l4[1])
+
+# Devuelve la posición de la cabecera TCP/UDP y la de su checksum, o None si la
+# cabecera no está completa o es un túnel UDP que Scapy sigue diseccionando.
+def findL4Offset(frame, offset, end, proto):
+	if proto == PROTO_TCP:
+		if end < offset + 20 or end < offset + (frame[offset + 12] >> 4) * 4 or frame[offset + 12] >> 4 < 5:
+			return None
+		return offset, offset + 16
+	if end < offset + 8:
+		return None
+	ports = (int.from_bytes(frame[offset:offset + 2], "big"), int.from_bytes(frame[offset + 2:offset + 4], "big"))
+	if ports[0] in PUERTOS_TUNEL_UDP or ports[1] in PUERTOS_TUNEL_UDP:
+		return None
+	return offset, offset + 6
+
+# Intercambia en [frame] los [size] bytes que empiezan en [a] con los que
+# empiezan en [b].
+def swapBytes(frame, a, b, size):
+	frame[a:a + size], frame[b:b + size] = frame[b:b + size], frame[a:a + size]
+
+# Actualiza de forma incremental (RFC 1624) el checksum de [frame] en
+# [checksumOffset] tras cambiar las palabras de 16 bits [oldWords] por
+# [newWords]. Si la suma de las palabras no cambia (como al intercambiar dos
+# campos) el checksum se queda igual. Con [zeroMeansNone] (UDP), un checksum 0
+# indica que no se usa y tampoco se toca.
+def patchChecksum(frame, checksumOffset, oldWords, newWords, zeroMeansNone=False):
+	checksum = int.from_bytes(frame[checksumOffset:checksumOffset + 2], "big")
+	if sum(oldWords) == sum(newWords) or (zeroMeansNone and checksum == 0):
+		return
+	total = ~checksum & 0xffff								# HC' = ~(~HC + ~m + m')
+	for old, new in zip(oldWords, newWords):
+		total += (~old & 0xffff) + new
+	while total >> 16:
+		total = (total & 0xffff) + (total >> 16)
+	frame[checksumOffset:checksumOffset + 2] = (~total & 0xffff).to_bytes(2, "big")
+
+# Devuelve las palabras de 16 bits de un trozo de [frame].
+def words(frame, start, stop):
+	return [int.from_bytes(frame[i:i + 2], "big") for i in range(start, stop, 2)]
+
+# Aplica los intercambios [swaps] directamente sobre los bytes de la trama
+# (bytearray). Devuelve False si la trama no se sabe tratar sin Scapy.
+def swapRawFrame(frame, swaps):
+	offsets = findOffsets(frame)
+	if offsets is None:
+		return False
+	ipOffset, l4Offset, l4Checksum = offsets
+	isUDP = l4Checksum is not None and l4Checksum == l4Offset + 6
+	if "ether" in swaps:
+		swapBytes(frame, 0, 6, 6)
+	if "ip" in swaps and ipOffset is not None:
+		old = words(frame, ipOffset + 12, ipOffset + 20)
+		swapBytes(frame, ipOffset + 12, ipOffset + 16, 4)
+		new = words(frame, ipOffset + 12, ipOffset + 20)
+		patchChecksum(frame, ipOffset + 10, old, new)
+		if l4Offset is not None:
+			patchChecksum(frame, l4Checksum, old, new, isUDP)		# Pseudo-cabecera TCP/UDP.
+	if "ports" in swaps and l4Offset is not None:
+		old = words(frame, l4Offset, l4Offset + 4)
+		swapBytes(frame, l4Offset, l4Offset + 2, 2)
+		patchChecksum(frame, l4Checksum, old, words(frame, l4Offset, l4Offset + 4), isUDP)
+	return True
+
+# Aplica los intercambios [swaps] a una trama con Scapy (para las tramas que
+# swapRawFrame() no sabe tratar) y devuelve sus bytes y su tamaño original.
+def swapScapyFrame(frame, swaps):
+	try:
+		packet = Ether(frame.data)
+	except Exception:
+		return frame.data, frame.wirelen	# Como PcapReader: Scapy la dejaría como Raw.
+	packet.wirelen = frame.wirelen
+	for swap in swaps:
+		SCAPY_SWAPS[swap](packet)
+	data = bytes(packet)
+	return data, len(data) if packet.wirelen is None else packet.wirelen
+
+# Aplica los intercambios [swaps] a una trama de la captura, sin Scapy si se
+# puede. Devuelve sus bytes y su tamaño original.
+def swapRecord(frame, swaps):
+	data = bytearray(frame.data)
+	if not swapRawFrame(data, swaps):
+		return swapScapyFrame(frame, swaps)
+	# Scapy olvida el tamaño original de la trama al cambiar un campo de
+	# Ethernet (y escribe el capturado); se hace igual.
+	return data, len(data) if "ether" in swaps else frame.wirelen
+
+# Genera la nueva captura sin diseccionar los paquetes con Scapy: de cada
+# trama solo se buscan las posiciones de las cabeceras Ethernet (y VLAN),
+# IPv4 y TCP/UDP, y se intercambian los bytes de los campos directamente. El
+# resultado es el mismo que con swapFieldsScapy() (también los checksums, que
+# no cambian al intercambiar campos), pero mucho más rápido. Las tramas que no
+# se saben tratar así (túneles, cabeceras cortadas...) pasan por Scapy.
+@prof.stage("swapFieldsRaw")
+def swapFieldsRaw(goodPcap, badPcap, swaps):
+	if rpcap.firstLinktype(goodPcap, LINKTYPE_ETHERNET) != LINKTYPE_ETHERNET:
+		return swapFieldsScapy(goodPcap, badPcap, swaps)
+	start = time.perf_counter()
+	count = 0
+	with open(goodPcap, "rb") as good, open(badPcap, "wb") as bad:
+		rpcap.writePcapHeader(bad, LINKTYPE_ETHERNET)		# También si no hay tramas.
+		for frame in rpcap.iterFrames(good):
+			rpcap.writePcapRecord(bad, frame, *swapRecord(frame, swaps))
+			count += 1
+			if count % PROGRESO == 0:
+				showProgress(count, start)
+	prof.addRows(count)
+	return showProgress(count, start, end="\n")
+
+# Genera la nueva captura con los dos métodos, comprueba que el resultado es
+# el mismo y compara su velocidad.
+def benchmarkSwapFields(goodPcap, badPcap, swaps):
+	print("Con Scapy:")
+	scapyRate = swapFieldsScapy(goodPcap, badPcap + ".scapy", swaps)
+	print("Sin Scapy (bytes):")
+	rawRate = swapFieldsRaw(goodPcap, badPcap, swaps)
+	with open(badPcap, "rb") as raw, open(badPcap + ".scapy", "rb") as scapy:
+		same = raw.read() == scapy.read()
+	print("· Mismo resultado: " + ("sí" if same else "NO"))
+	print("· Aceleración: x" + "%.1f" % (rawRate / max(scapyRate, 1e-9)))
+	os.remove(badPcap + ".scapy")
+
+# Genera la nueva captura con el método [engine] ("raw", "scapy" o "bench").
+def swapFields(goodPcap, badPcap, swaps, engine):
+	if engine == "scapy":
+		swapFieldsScapy(goodPcap, badPcap, swaps)
+	elif engine == "bench":
+		benchmarkSwapFields(goodPcap, badPcap, swaps)
+	else:
+		swapFieldsRaw(goodPcap, badPcap, swaps)
+
+# Variantes que se pueden generar a la vez (modo batch): opción del menú,
+# sufijo de su captura y campos que se intercambian.
+VARIANTS = {
+	"1": ("Eth", ["ether"]),
+	"2": ("IP", ["ip"]),
+	"3": ("EthIP", ["ether", "ip"]),
+	"4": ("Ports", ["ports"]),
+	"5": ("IPPorts", ["ip", "ports"]),
+	"6": ("EthIPPorts", ["ether", "ip", "ports"]),
+}
+
+# Devuelve el nombre de la captura de una variante: [badPcap] con el sufijo
+# de la variante (captura-mala.pcap -> captura-mala-IP.pcap).
+def variantPcap(badPcap, suffix):
+	root, ext = os.path.splitext(badPcap)
+	return root + "-" + suffix + (ext or ".pcap")
+
+# Muestra, para cada captura generada en el modo batch, cuántos paquetes
+# tiene, cuánto ocupa y a qué velocidad se ha generado (sin contar la lectura
+# de la captura original, que es común a todas).
+def showBatchReport(stats, start):
+	for path, (count, seconds) in stats.items():
+		print("· " + path + ": " + str(count) + " paquetes, " + "%.1f" % (os.path.getsize(path) / 2**20) +
+			" MiB (" + "%.0f" % (count / max(seconds, 1e-9)) + " paquetes/s)")
+	print("· Total: " + "%.2f" % (time.perf_counter() - start) + " s")
+
+# Genera con Scapy las capturas de varias variantes leyendo [goodPcap] una
+# sola vez: cada paquete se copia y se escribe en la captura de cada variante.
+@prof.stage("batchSwapFieldsScapy")
+def batchSwapFieldsScapy(goodPcap, outputs):
+	start = time.perf_counter()
+	count = 0
+	stats = {path: [0, 0.0] for path in outputs}
+	writers = {path: PcapWriter(path) for path in outputs}
+	with PcapReader(goodPcap) as reader:
+		for packet in reader:
+			for path, swaps in outputs.items():
+				variantStart = time.perf_counter()
+				newPacket = packet.copy()
+				for swap in swaps:
+					SCAPY_SWAPS[swap](newPacket)
+				writers[path].write(newPacket)
+				stats[path][0] += 1
+				stats[path][1] += time.perf_counter() - variantStart
+			count += 1
+			if count % PROGRESO == 0:
+				showProgress(count, start)
+	for writer in writers.values():
+		writer.close()
+	prof.addRows(count)
+	showProgress(count, start, end="\n")
+	showBatchReport(stats, start)
+
+# Como batchSwapFieldsScapy(), intercambiando los bytes directamente (como
+# swapFieldsRaw()).
+@prof.stage("batchSwapFieldsRaw")
+def batchSwapFieldsRaw(goodPcap, outputs):
+	if rpcap.firstLinktype(goodPcap, LINKTYPE_ETHERNET) != LINKTYPE_ETHERNET:
+		return batchSwapFieldsScapy(goodPcap, outputs)
+	start = time.perf_counter()
+	count = 0
+	stats = {path: [0, 0.0] for path in outputs}
+	writers = {path: open(path, "wb") for path in outputs}
+	for writer in writers.values():
+		rpcap.writePcapHeader(writer, LINKTYPE_ETHERNET)		# También si no hay tramas.
+	with open(goodPcap, "rb") as good:
+		for frame in rpcap.iterFrames(good):
+			for path, swaps in outputs.items():
+				variantStart = time.perf_counter()
+				rpcap.writePcapRecord(writers[path], frame, *swapRecord(frame, swaps))
+				stats[path][0] += 1
+				stats[path][1] += time.perf_counter() - variantStart
+			count += 1
+			if count % PROGRESO == 0:
+				showProgress(count, start)
+	for writer in writers.values():
+		writer.close()
+	prof.addRows(count)
+	showProgress(count, start, end="\n")
+	showBatchReport(stats, start)
+
+# Genera a la vez las capturas de las variantes [options] (opciones del
+# menú), con el método [engine] ("raw" o "scapy"), leyendo [goodPcap] una
+# sola vez. Cada una se guarda en [badPcap] con el sufijo de su variante.
+def batchSwapFields(goodPcap, badPcap, options, engine="raw"):
+	outputs = {variantPcap(badPcap, VARIANTS[num][0]): VARIANTS[num][1] for num in options}
+	if engine == "scapy":
+		batchSwapFieldsScapy(goodPcap, outputs)
+	else:
+		batchSwapFieldsRaw(goodPcap, outputs)
+
+# Genera una nueva captura intercambiando las direcciones Ethernet.
+def exchangeEthernetDirs(goodPcap, badPcap, engine="raw"):
+	swapFields(goodPcap, badPcap, ["ether"], engine)
 
 # Genera una nueva captura intercambiando las direcciones IP.
-def exchangeIPDirs(goodPcap, badPcap):
-	packets = rdpcap(goodPcap)
-	for packet in packets:
-		if IP in packet:					# No todos los paquetes pasan por el nivel IP (ARP por ejemplo)
-			IPSrc = packet[IP].src
-			packet[IP].src = packet[IP].dst
-			packet[IP].dst = IPSrc
-	wrpcap(badPcap, packets)
+def exchangeIPDirs(goodPcap, badPcap, engine="raw"):
+	swapFields(goodPcap, badPcap, ["ip"], engine)
 
 # Genera una nueva captura intercambiando las direcciones Ethernet e IP.
-def exchangeEthernetIPDirs(goodPcap, badPcap):
-	packets = rdpcap(goodPcap)
-	for packet in packets:
-		EtherSrc = packet[Ether].src
-		packet[Ether].src = packet[Ether].dst
-		packet[Ether].dst = EtherSrc
-		if IP in packet:
-			IPSrc = packet[IP].src
-			packet[IP].src = packet[IP].dst
-			packet[IP].dst = IPSrc
-	wrpcap(badPcap, packets)
+def exchangeEthernetIPDirs(goodPcap, badPcap, engine="raw"):
+	swapFields(goodPcap, badPcap, ["ether", "ip"], engine)
 
 # Genera una nueva captura intercambiando los puertos TCP/UDP.
-def exchangeTCPUDPPorts(goodPcap, badPcap):
-	packets = rdpcap(goodPcap)
-	for packet in packets:
-		if TCP in packet:
-			TCPSPort = packet[TCP].sport
-			packet[TCP].sport = packet[TCP].dport
-			packet[TCP].dport = TCPSPort
-		if UDP in packet:
-			UDPSPort = packet[UDP].sport
-			packet[UDP].sport = packet[UDP].dport
-			packet[UDP].dport = UDPSPort
-	wrpcap(badPcap, packets)
+def exchangeTCPUDPPorts(goodPcap, badPcap, engine="raw"):
+	swapFields(goodPcap, badPcap, ["ports"], engine)
 
 # Genera una nueva captura intercambiando las direcciones IP y los puertos TCP/UDP.
-def exchangeIPDirsTCPUDPPorts(goodPcap, badPcap):
-	packets = rdpcap(goodPcap)
-	for packet in packets:
-		if IP in packet:
-			IPSrc = packet[IP].src
-			packet[IP].src = packet[IP].dst
-			packet[IP].dst = IPSrc
-		if TCP in packet:
-			TCPSPort = packet[TCP].sport
-			packet[TCP].sport = packet[TCP].dport
-			packet[TCP].dport = TCPSPort
-		if UDP in packet:
-			UDPSPort = packet[UDP].sport
-			packet[UDP].sport = packet[UDP].dport
-			packet[UDP].dport = UDPSPort
-	wrpcap(badPcap, packets)
+def exchangeIPDirsTCPUDPPorts(goodPcap, badPcap, engine="raw"):
+	swapFields(goodPcap, badPcap, ["ip", "ports"], engine)
 
 # Genera una nueva captura intercambiando las direcciones Ethernet, IP y los puertos TCP/UDP
-def exchangeEthernetIPDirsTCPUDPPOrts(goodPcap, badPcap):
-	packets = rdpcap(goodPcap)
-	for packet in packets:
-		EtherSrc = packet[Ether].src
-		packet[Ether].src = packet[Ether].dst
-		packet[Ether].dst = EtherSrc
-		if IP in packet:
-			IPSrc = packet[IP].src
-			packet[IP].src = packet[IP].dst
-			packet[IP].dst = IPSrc
-		if TCP in packet:
-			TCPSPort = packet[TCP].sport
-			packet[TCP].sport = packet[TCP].dport
-			packet[TCP].dport = TCPSPort
-		if UDP in packet:
-			UDPSPort = packet[UDP].sport
-			packet[UDP].sport = packet[UDP].dport
-			packet[UDP].dport = UDPSPort
-	wrpcap(badPcap, packets)
+def exchangeEthernetIPDirsTCPUDPPOrts(goodPcap, badPcap, engine="raw"):
+	swapFields(goodPcap, badPcap, ["ether", "ip", "ports"], engine)
 
 # Procesa la opción elegida por el usuario.
-def processOption(num, goodPcap, badPcap):
+def processOption(num, goodPcap, badPcap, engine):
 	if num == "1":
-		exchangeEthernetDirs(goodPcap, badPcap)
+		exchangeEthernetDirs(goodPcap, badPcap, engine)
 	elif num == "2":
-		exchangeIPDirs(goodPcap, badPcap)
+		exchangeIPDirs(goodPcap, badPcap, engine)
 	elif num == "3":
-		exchangeEthernetIPDirs(goodPcap, badPcap)
+		exchangeEthernetIPDirs(goodPcap, badPcap, engine)
 	elif num == "4":
-		exchangeTCPUDPPorts(goodPcap, badPcap)
+		exchangeTCPUDPPorts(goodPcap, badPcap, engine)
 	elif num == "5":
-		exchangeIPDirsTCPUDPPorts(goodPcap, badPcap)
+		exchangeIPDirsTCPUDPPorts(goodPcap, badPcap, engine)
 	elif num == "6":
-		exchangeEthernetIPDirsTCPUDPPOrts(goodPcap, badPcap)
+		exchangeEthernetIPDirsTCPUDPPOrts(goodPcap, badPcap, engine)
 	else:
 		print("Esa opción no existe")
 		sys.exit()
 
-goodPcap, badPcap = checkExecution()
-showMenu()
-num = getOption()
-processOption(num, goodPcap, badPcap)
+# El programa solo se ejecuta al lanzarlo (no al importarlo, por ejemplo desde
+# benchmarkPipeline.py).
+if __name__ == "__main__":
+	goodPcap, badPcap, engine, batch = checkExecution()
+	if batch is not None:
+		batchSwapFields(goodPcap, badPcap, batch, engine)
+	else:
+		showMenu()
+		num = getOption()
+		processOption(num, goodPcap, badPcap, engine)
@@ -11,29 +11,98 @@
 #
 # Se utiliza para crear las partes de tráfico anómalo en los datasets de redes
 # IPv6.
+#
+# La captura se reparte en trozos de [TAM_TROZO] paquetes que se generan en
+# paralelo (en [workers] procesos), cada uno en su propia captura parcial; al
+# final se juntan en el orden original. Las direcciones MAC y los prefijos
+# aleatorios de cada trozo salen de un generador con la semilla [seed] y el
+# número del trozo, así que con la misma semilla se obtiene siempre la misma
+# captura, sea cual sea el número de procesos.
+#
+# Los paquetes NS, NA y RA tienen siempre la misma forma: por defecto se
+# serializan una sola vez con Scapy (plantillas) y para cada trozo solo se
+# copian en ellas las direcciones, la MAC o el prefijo y se calcula el
+# checksum ICMPv6, todo con NumPy.
 
 # ENTRADAS:
 # goodPcap => captura de tráfico original (con el tráfico "bueno").
 # badPcap => captura de tráfico que queremos que albergue el tráfico "malo" generado.
+# workers => (opcional) número de procesos que generan los paquetes (1 por
+#			 defecto).
+# seed => (opcional) semilla de los valores aleatorios (por defecto, cada
+#		  ejecución es distinta).
+# engine => (opcional) cómo se generan los paquetes: "template" (por defecto,
+#			 con las plantillas), "scapy" (creando cada paquete con Scapy) o
+#			 "bench" (los dos, comparando resultado y velocidad).
+# batch => (opcional) opciones del menú que se generan a la vez, sin
+#			preguntar ("1,3" o "all" para las tres), leyendo la captura
+#			original una sola vez.
 
 # SALIDAS:
 # 1. La captura de tráfico con el tráfico "malo" generado (badPcap con el
-# tráfico sospechoso).
+# tráfico sospechoso). En el modo batch, una captura por opción con el sufijo
+# de su técnica (NS, NA o RA): captura-mala.pcap -> captura-mala-NS.pcap...
 
 # EJEMPLO DE EJECUCIÓN:
-# python3 generateBadIPv6Pcap.py captura-buena.pcap captura-mala-NS.pcap
+# python3 generateBadIPv6Pcap.py captura-buena.pcap captura-mala-NS.pcap [workers=4] [seed=1] [engine=template]
+# python3 generateBadIPv6Pcap.py captura-buena.pcap captura-mala.pcap batch=all seed=1
 ##############################################################################
 
 from scapy.all import *
+import readPcapFile as rpcap
+import stageProfiler as prof
+import numpy as np
+import multiprocessing
+import collections
+import socket
+import shutil
+import time
+import sys
+import os
+
+TAM_TROZO = 10000		# Paquetes de la captura original por trozo.
+
+# Tipos de enlace de la captura original y de la generada (paquetes IPv6 sin
+# cabecera Ethernet, como los escribe Scapy).
+LINKTYPE_ETHERNET = 1
+LINKTYPE_IPV6 = 229
+
+# Valores de las cabeceras que se reconocen sin Scapy.
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86dd
+ETHERTYPE_ARP = 0x0806
+ETHERTYPES_VLAN = (0x8100, 0x88a8)				# 802.1Q y 802.1ad.
+PROTO_UDP = 17
+PROTOS_TUNEL = (4, 41, 47, 50, 51)				# IP en IP, IPv6 en IP, GRE, ESP y AH.
+# Puertos UDP en los que Scapy diseccionaría otro paquete dentro (VXLAN, L2TP, GRE...).
+PUERTOS_TUNEL_UDP = (434, 1701, 4500, 4754, 4789, 4790, 6633, 8472, 48879)
 
 # Comprueba si se ha ejecutado bien el programa. Si está bien ejecutado, devuelve [goodPcap] y [badPcap].
+# También devuelve el número de procesos ([workers]), la semilla ([seed], None
+# si no se indica), el método con el que se generan los paquetes ([engine]) y
+# las opciones del menú que se generan a la vez en el modo batch ([batch],
+# None si se pregunta por el menú).
 def checkExecution():
-	if len(sys.argv) != 3:
-		print("usage: python3 generateBadIPv6Pcap.py [goodPcap] [badPcap]")
+	options = {"workers": "1", "seed": None, "engine": "template", "batch": None}
+	for arg in sys.argv[3:]:
+		key, _, value = arg.partition("=")
+		if key not in options or (key in ("workers", "seed") and not value.isdigit()):
+			options = None
+			break
+		options[key] = value
+	batch = options and options["batch"]
+	if batch is not None:
+		batch = list(VARIANTS) if batch == "all" else batch.split(",")
+	if len(sys.argv) < 3 or options is None or int(options["workers"]) < 1 or \
+			options["engine"] not in ("template", "scapy", "bench") or \
+			(batch is not None and (options["engine"] == "bench" or not set(batch) <= set(VARIANTS))):
+		print("usage: python3 generateBadIPv6Pcap.py [goodPcap] [badPcap] [workers=N] [seed=N] " +
+			"[engine=template|scapy|bench] [batch=1,2,3|all]")
 		sys.exit()
 	goodPcap = sys.argv[1]
 	badPcap = sys.argv[2]
-	return goodPcap, badPcap
+	seed = None if options["seed"] is None else int(options["seed"])
+	return goodPcap, badPcap, int(options["workers"]), seed, options["engine"], batch
 
 # Muestra al usuario un menú para que elija cómo quiere generar la nueva captura.
 def showMenu():
@@ -52,97 +121,392 @@ def getOption():
 	num = input("Su opción es: ")
 	return num
 
-# Genera direcciones Ethernet aleatorias:
+# Genera [count] direcciones Ethernet aleatorias (matriz uint8 de count x 6
+# bytes) con el generador [rng].
+def generateEthernetAddresses(rng, count):
+	return rng.integers(0, 256, (count, 6), dtype=np.uint8)		# De 0 a (2^8bits - 1)
+
+# Genera [count] prefijos de red IPv6 aleatorios: los dos grupos de 16 bits
+# que siguen a 2001:db8: (matriz uint16 de count x 2) con el generador [rng].
+def generateIPv6Prefixes(rng, count):
+	return rng.integers(0, 65536, (count, 2), dtype=np.uint16)	# De 0 a (2^16bits - 1)
+
+# Devuelve el texto de una dirección Ethernet generada:
 # https://stackoverflow.com/questions/50187634/random-mac-address-generator-in-python
-def generateEthernetAddress():
-	hexBytesList = []
-	for i in range(6):
-		decimalByte = random.randint(0, 255)	# De 0 a (2^8bits - 1)
-		hexByte = '%02x' % decimalByte
-		hexBytesList.append(hexByte)
-	EthAddress = ":".join(hexBytesList)
-	return EthAddress
+def formatEthernetAddress(address):
+	return ":".join('%02x' % decimalByte for decimalByte in address)
+
+# Devuelve el texto de un prefijo IPv6 generado:
+# https://stackoverflow.com/questions/7660485/how-to-generate-random-ipv6-address-using-pythonor-in-scapy
+def formatIPv6Prefix(prefix):
+	return "2001:db8:" + ":".join('%02x' % decimalTwoBytes for decimalTwoBytes in prefix) + "::"
+
+# Crea, a partir de las direcciones IPv6 de un paquete de la captura (buena),
+# uno que falsea la caché de la máquina destino, asociando la máquina origen a
+# una dirección MAC inválida (ataque DoS).
+# -- Con mensajes NS --
+def buildNS(IPv6Src, IPv6Dst, address, prefix):
+	newPacket1 = IPv6(src=IPv6Src, dst=IPv6Dst)
+	newPacket2 = ICMPv6ND_NS(tgt=IPv6Dst)
+	randomEthAddress = formatEthernetAddress(address)
+	newPacket3 = ICMPv6NDOptSrcLLAddr(lladdr=randomEthAddress)
+	return newPacket1 / newPacket2 / newPacket3
+
+# Crea, a partir de las direcciones IPv6 de un paquete de la captura (buena),
+# uno que falsea la caché de la máquina destino, asociando la máquina origen a
+# una dirección MAC inválida (ataque DoS).
+# -- Con mensajes NA --
+def buildNA(IPv6Src, IPv6Dst, address, prefix):
+	newPacket1 = IPv6(src=IPv6Src, dst=IPv6Dst)
+	newPacket2 = ICMPv6ND_NA(R=0, tgt=IPv6Src)
+	randomEthAddress = formatEthernetAddress(address)
+	newPacket3 = ICMPv6NDOptDstLLAddr(lladdr=randomEthAddress)
+	return newPacket1 / newPacket2 / newPacket3
+
+# Crea, a partir de las direcciones IPv6 de un paquete de la captura (buena),
+# uno que configura erróneamente la dirección global IPv6 de la máquina
+# destino (con una dirección aleatoria, ataque DoS).
+# -- Con mensajes RA --
+def buildRA(IPv6Src, IPv6Dst, address, prefix):
+	newPacket1 = IPv6(src=IPv6Src, dst="ff02::1")
+	newPacket2 = ICMPv6ND_RA(M=0, O=0)
+	ramdomIPv6Prefix = formatIPv6Prefix(prefix)
+	newPacket3 = ICMPv6NDOptPrefixInfo(prefixlen=64, prefix=ramdomIPv6Prefix, L=1, A=1)
+	return newPacket1 / newPacket2 / newPacket3
+
+# Paquetes que se generan con cada técnica.
+ATTACKS = {"NS": buildNS, "NA": buildNA, "RA": buildRA}
+
+# Plantilla (bytes del paquete con ceros en los campos que cambian y en el
+# checksum) de cada técnica, serializada una sola vez con Scapy.
+def buildTemplate(attack):
+	packet = bytearray(bytes(ATTACKS[attack]("::", "::", bytes(6), [0, 0])))
+	packet[42:44] = bytes(2)								# Checksum ICMPv6.
+	return np.frombuffer(bytes(packet), dtype=np.uint8)
+
+TEMPLATES = {attack: buildTemplate(attack) for attack in ATTACKS}
+
+# Posiciones de los campos que cambian en cada plantilla (cabecera IPv6 de 40
+# bytes, mensaje ICMPv6 y su opción).
+IPV6_SRC = slice(8, 24)
+IPV6_DST = slice(24, 40)
+ND_TARGET = slice(48, 64)
+ND_LLADDR = slice(66, 72)
+RA_PREFIX = slice(76, 80)									# Tras 2001:db8: (72-76).
+ICMPV6_CHECKSUM = slice(42, 44)
+ICMPV6_NH = 58
+
+# Crea de una vez los paquetes de la técnica [attack] a partir de la
+# plantilla, con las direcciones IPv6 [srcs] y [dsts] (matrices uint8 de n x
+# 16), las direcciones MAC [addresses] y los prefijos [prefixes]. Devuelve la
+# matriz uint8 con un paquete por fila.
+def synthesizeTemplate(attack, srcs, dsts, addresses, prefixes):
+	packets = np.tile(TEMPLATES[attack], (len(srcs), 1))
+	packets[:, IPV6_SRC] = srcs
+	if attack == "RA":
+		packets[:, RA_PREFIX] = prefixes.astype(">u2").view(np.uint8)
+	else:
+		packets[:, IPV6_DST] = dsts
+		packets[:, ND_TARGET] = dsts if attack == "NS" else srcs
+		packets[:, ND_LLADDR] = addresses
+
+	# Checksum ICMPv6: suma en complemento a uno de la pseudo-cabecera
+	# (direcciones, longitud y siguiente cabecera) y del mensaje ICMPv6.
+	length = packets.shape[1] - 40
+	total = packets.view(">u2")[:, 4:].sum(axis=1, dtype=np.uint64) + length + ICMPV6_NH
+	while (total >> 16).any():
+		total = (total & 0xffff) + (total >> 16)
+	packets[:, ICMPV6_CHECKSUM] = (~total & 0xffff).astype(">u2").view(np.uint8).reshape(-1, 2)
+	return packets
+
+# Devuelve el generador de valores aleatorios de un trozo de la captura: el
+# mismo para la misma semilla y el mismo trozo (o uno sin semilla si no se
+# indica [seed]).
+def shardRandom(seed, shard):
+	return np.random.default_rng(None if seed is None else [seed, shard])
+
+# Recorre la captura por trozos: listas de (tipo de enlace, bytes) de
+# [TAM_TROZO] tramas.
+def iterChunks(goodPcap):
+	chunk = []
+	with open(goodPcap, "rb") as f:
+		for frame in rpcap.iterFrames(f):
+			chunk.append((frame.linktype, frame.data))
+			if len(chunk) == TAM_TROZO:
+				yield chunk
+				chunk = []
+	if chunk:
+		yield chunk
+
+# Devuelve las direcciones IPv6 (texto) origen y destino de una trama
+# diseccionándola con Scapy según su tipo de enlace (como rdpcap()), o None si
+# no tiene nivel IPv6.
+def scapyIPv6Addresses(linktype, data):
+	try:
+		packet = conf.l2types.num2layer[linktype](data)
+	except Exception:
+		return None								# Scapy la dejaría como Raw: sin IPv6.
+	if IPv6 in packet:
+		return packet[IPv6].src, packet[IPv6].dst
+	return None
+
+# Devuelve las direcciones IPv6 (16 bytes cada una) origen y destino de una
+# trama, o None si no tiene nivel IPv6. Sin Scapy, solo se buscan en las
+# tramas Ethernet (con VLAN o sin ella) con IPv6 directamente encima; las
+# IPv4, ARP... no tienen IPv6 salvo que sean túneles, que (como cualquier
+# otra trama que no se sepa tratar así) se diseccionan con Scapy.
+def findIPv6Addresses(linktype, data):
+	if linktype == LINKTYPE_ETHERNET and len(data) >= 14:
+		etherType = int.from_bytes(data[12:14], "big")
+		offset = 14
+		while etherType in ETHERTYPES_VLAN and len(data) >= offset + 4:
+			etherType = int.from_bytes(data[offset + 2:offset + 4], "big")
+			offset += 4
+		if etherType == ETHERTYPE_IPV6 and len(data) >= offset + 40:
+			return data[offset + 8:offset + 24], data[offset + 24:offset + 40]
+		if etherType == ETHERTYPE_ARP:
+			return None
+		if etherType == ETHERTYPE_IPV4 and len(data) >= offset + 28 and data[offset] >> 4 == 4:
+			proto = data[offset + 9]
+			l4 = offset + (data[offset] & 15) * 4
+			ports = (int.from_bytes(data[l4:l4 + 2], "big"), int.from_bytes(data[l4 + 2:l4 + 4], "big"))
+			if proto not in PROTOS_TUNEL and not (proto == PROTO_UDP and
+					(ports[0] in PUERTOS_TUNEL_UDP or ports[1] in PUERTOS_TUNEL_UDP)):
+				return None
+	addresses = scapyIPv6Addresses(linktype, data)
+	if addresses is None:
+		return None
+	return tuple(socket.inet_pton(socket.AF_INET6, address) for address in addresses)
+
+# Muestra cuántos paquetes se llevan procesados y a qué velocidad.
+def showProgress(count, start, end="\r"):
+	elapsed = max(time.perf_counter() - start, 1e-9)
+	print("· " + str(count) + " paquetes (" + "%.0f" % (count / elapsed) + " paquetes/s)", end=end, flush=True)
+	return count / elapsed
+
+# Escribe los registros (sin cabecera global) de los paquetes "malos" de un
+# trozo de la captura con cada técnica de [files] (técnica -> fichero),
+# generados con el método [engine] ("template" o "scapy"). Las tramas con
+# nivel IPv6 se buscan una sola vez para todas las técnicas, y la MAC y el
+# prefijo de cada una dependen de su posición en el trozo, así que los dos
+# métodos (y una técnica sola o junto con otras) generan los mismos paquetes.
+# Devuelve, por técnica, cuántos paquetes escribe y el tiempo que tarda.
+def writeChunk(files, chunk, seed, shard, engine):
+	rng = shardRandom(seed, shard)
+	addresses = generateEthernetAddresses(rng, len(chunk))
+	prefixes = generateIPv6Prefixes(rng, len(chunk))
+	stats = {}
+	if engine == "scapy":
+		found = []
+		for i, (linktype, data) in enumerate(chunk):
+			IPv6Addresses = scapyIPv6Addresses(linktype, data)
+			if IPv6Addresses is not None:
+				found.append((i, IPv6Addresses))
+		for attack, f in files.items():
+			start = time.perf_counter()
+			for i, IPv6Addresses in found:
+				packet = ATTACKS[attack](*IPv6Addresses, addresses[i], prefixes[i])
+				seconds = int(packet.time)
+				usec = int(round((packet.time - seconds) * 1000000))
+				data = bytes(packet)
+				rpcap.writePcapRecord(f, rpcap.Frame(0, LINKTYPE_IPV6, seconds, usec, 1000000, data, len(data)), data)
+			stats[attack] = [len(found), time.perf_counter() - start]
+		return stats
+
+	rows, srcs, dsts = [], [], []
+	for i, (linktype, data) in enumerate(chunk):
+		IPv6Addresses = findIPv6Addresses(linktype, data)
+		if IPv6Addresses is not None:
+			rows.append(i)
+			srcs.append(IPv6Addresses[0])
+			dsts.append(IPv6Addresses[1])
+	srcs = np.frombuffer(b"".join(srcs), dtype=np.uint8).reshape(-1, 16)
+	dsts = np.frombuffer(b"".join(dsts), dtype=np.uint8).reshape(-1, 16)
+	for attack, f in files.items():
+		start = time.perf_counter()
+		if rows:
+			packets = synthesizeTemplate(attack, srcs, dsts, addresses[rows], prefixes[rows])
+
+			# Registros de la captura: cabecera (instante, tamaño capturado y
+			# original) seguida del paquete, todos de una vez.
+			now = time.time()
+			headers = np.empty((len(packets), 4), dtype=np.uint32)
+			headers[:, 0] = int(now)
+			headers[:, 1] = int(now % 1 * 1000000)
+			headers[:, 2:] = packets.shape[1]
+			f.write(np.hstack([headers.view(np.uint8), packets]).tobytes())
+		stats[attack] = [len(rows), time.perf_counter() - start]
+	return stats
+
+# Suma a [total] las estadísticas (paquetes y tiempo por técnica) de un trozo.
+def addStats(total, stats):
+	for attack, (count, seconds) in stats.items():
+		total[attack][0] += count
+		total[attack][1] += seconds
+	return max(count for count, _ in total.values())
+
+# Genera en un proceso aparte los paquetes de un trozo y escribe sus
+# registros en las capturas parciales [shardPcaps] (técnica -> fichero).
+# Devuelve las estadísticas de writeChunk().
+def synthesizeShard(chunk, seed, shard, engine, shardPcaps):
+	files = {attack: open(shardPcap, "wb") for attack, shardPcap in shardPcaps.items()}
+	try:
+		return writeChunk(files, chunk, seed, shard, engine)
+	finally:
+		for f in files.values():
+			f.close()
+
+# Junta las capturas parciales (en orden) en [badPcap], tras la cabecera global.
+def mergeShards(shardPcaps, badPcap):
+	with open(badPcap, "wb") as bad:
+		rpcap.writePcapHeader(bad, LINKTYPE_IPV6)
+		for shardPcap in shardPcaps:
+			with open(shardPcap, "rb") as shard:
+				shutil.copyfileobj(shard, bad)
+			os.remove(shardPcap)
+
+# Genera las nuevas capturas de [outputs] (técnica "NS", "NA" o "RA" ->
+# captura), trozo a trozo, en un solo proceso. Devuelve la velocidad y las
+# estadísticas de cada técnica.
+@prof.stage("generateSequential")
+def generateSequential(goodPcap, outputs, seed, engine):
+	start = time.perf_counter()
+	count = 0
+	stats = {attack: [0, 0.0] for attack in outputs}
+	files = {attack: open(badPcap, "wb") for attack, badPcap in outputs.items()}
+	try:
+		for f in files.values():
+			rpcap.writePcapHeader(f, LINKTYPE_IPV6)
+		for shard, chunk in enumerate(iterChunks(goodPcap)):
+			count = addStats(stats, writeChunk(files, chunk, seed, shard, engine))
+			showProgress(count, start)
+	finally:
+		for f in files.values():
+			f.close()
+	prof.addRows(count)
+	return showProgress(count, start, end="\n"), stats
+
+# Como generateSequential(), repartiendo los trozos entre [workers] procesos.
+# Como mucho hay 2 * [workers] trozos leídos a la espera, para que la memoria
+# no dependa del tamaño de la captura.
+@prof.stage("generateParallel")
+def generateParallel(goodPcap, outputs, workers, seed, engine):
+	start = time.perf_counter()
+	count = 0
+	stats = {attack: [0, 0.0] for attack in outputs}
+	shardPcaps = []
+	pending = collections.deque()
+	with multiprocessing.Pool(workers) as pool:
+		for shard, chunk in enumerate(iterChunks(goodPcap)):
+			shardPcaps.append({attack: badPcap + ".shard-" + str(shard) for attack, badPcap in outputs.items()})
+			pending.append(pool.apply_async(synthesizeShard, (chunk, seed, shard, engine, shardPcaps[-1])))
+			while len(pending) >= 2 * workers:
+				count = addStats(stats, pending.popleft().get())
+				showProgress(count, start)
+		while pending:
+			count = addStats(stats, pending.popleft().get())
+			showProgress(count, start)
+	for attack, badPcap in outputs.items():
+		mergeShards([shard[attack] for shard in shardPcaps], badPcap)
+	prof.addRows(count)
+	return showProgress(count, start, end="\n"), stats
+
+# Genera a la vez las capturas de [outputs] (técnica -> captura), en paralelo
+# si [workers] > 1, leyendo [goodPcap] una sola vez. Devuelve la velocidad y
+# las estadísticas de cada técnica.
+def generateAttacks(goodPcap, outputs, workers=1, seed=None, engine="template"):
+	if workers > 1:
+		return generateParallel(goodPcap, outputs, workers, seed, engine)
+	return generateSequential(goodPcap, outputs, seed, engine)
+
+# Genera la nueva captura con los dos métodos (con la misma semilla),
+# comprueba que los paquetes son los mismos (salvo el instante de captura, que
+# es el de su creación) y compara su velocidad.
+def benchmarkAttack(goodPcap, badPcap, attack, workers, seed):
+	seed = np.random.SeedSequence(seed).entropy if seed is None else seed
+	print("Con Scapy:")
+	scapyRate = generateAttack(goodPcap, badPcap + ".scapy", attack, workers, seed, "scapy")
+	print("Con plantillas:")
+	templateRate = generateAttack(goodPcap, badPcap, attack, workers, seed, "template")
+	with open(badPcap, "rb") as template, open(badPcap + ".scapy", "rb") as scapy:
+		same = [(frame.data, frame.wirelen) for frame in rpcap.iterFrames(template)] == \
+			[(frame.data, frame.wirelen) for frame in rpcap.iterFrames(scapy)]
+	print("· Mismo resultado: " + ("sí" if same else "NO"))
+	print("· Aceleración: x" + "%.1f" % (templateRate / max(scapyRate, 1e-9)))
+	os.remove(badPcap + ".scapy")
+
+# Genera la nueva captura con la técnica [attack], en paralelo si [workers] > 1,
+# con el método [engine] ("template", "scapy" o "bench"). Devuelve la velocidad.
+def generateAttack(goodPcap, badPcap, attack, workers=1, seed=None, engine="template"):
+	if engine == "bench":
+		return benchmarkAttack(goodPcap, badPcap, attack, workers, seed)
+	return generateAttacks(goodPcap, {attack: badPcap}, workers, seed, engine)[0]
+
+# Técnicas que se pueden generar a la vez (modo batch), por opción del menú.
+# Su nombre es también el sufijo de su captura.
+VARIANTS = {"1": "NS", "2": "NA", "3": "RA"}
+
+# Devuelve el nombre de la captura de una técnica: [badPcap] con el sufijo de
+# la técnica (captura-mala.pcap -> captura-mala-NS.pcap).
+def variantPcap(badPcap, attack):
+	root, ext = os.path.splitext(badPcap)
+	return root + "-" + attack + (ext or ".pcap")
+
+# Genera a la vez las capturas de las opciones del menú [options] leyendo
+# [goodPcap] una sola vez, cada una en [badPcap] con el sufijo de su técnica.
+# Al final muestra, para cada captura, cuántos paquetes tiene, cuánto ocupa y
+# a qué velocidad se ha generado (sin contar la lectura de la captura
+# original, que es común a todas).
+def batchAttacks(goodPcap, badPcap, options, workers=1, seed=None, engine="template"):
+	start = time.perf_counter()
+	outputs = {VARIANTS[num]: variantPcap(badPcap, VARIANTS[num]) for num in options}
+	_, stats = generateAttacks(goodPcap, outputs, workers, seed, engine)
+	for attack, (count, seconds) in stats.items():
+		print("· " + outputs[attack] + ": " + str(count) + " paquetes, " +
+			"%.1f" % (os.path.getsize(outputs[attack]) / 2**20) + " MiB (" +
+			"%.0f" % (count / max(seconds, 1e-9)) + " paquetes/s)")
+	print("· Total: " + "%.2f" % (time.perf_counter() - start) + " s")
 
 # Para cada paquete de una captura (buena), crea uno nuevo en otra captura
 # (mala) falseando la caché de la máquina destino, asociando la máquina origen
 # a una dirección MAC inválida (ataque DoS).
 # -- Con mensajes NS --
-def neighbourCacheAttackWithNS(goodPcap, badPcap):
-	packets = rdpcap(goodPcap)
-	packetsList = []
-	for packet in packets:
-		if IPv6 in packet:
-			IPv6Src = packet[IPv6].src
-			IPv6Dst = packet[IPv6].dst
-			newPacket1 = IPv6(src=IPv6Src, dst=IPv6Dst)
-			newPacket2 = ICMPv6ND_NS(tgt=IPv6Dst)
-			randomEthAddress = generateEthernetAddress()
-			newPacket3 = ICMPv6NDOptSrcLLAddr(lladdr=randomEthAddress)
-			newPacket = newPacket1 / newPacket2 / newPacket3
-			packetsList.append(newPacket)
-	wrpcap(badPcap, packetsList)
+def neighbourCacheAttackWithNS(goodPcap, badPcap, workers=1, seed=None, engine="template"):
+	generateAttack(goodPcap, badPcap, "NS", workers, seed, engine)
 
 # Para cada paquete de una captura (buena), crea uno nuevo en otra captura
 # (mala) falseando la caché de la máquina destino, asociando la máquina origen
 # a una dirección MAC inválida (ataque DoS).
 # -- Con mensajes NA --
-def neighbourCacheAttackWithNA(goodPcap, badPcap):
-	packets = rdpcap(goodPcap)
-	packetsList = []
-	for packet in packets:
-		if IPv6 in packet:
-			IPv6Src = packet[IPv6].src
-			IPv6Dst = packet[IPv6].dst
-			newPacket1 = IPv6(src=IPv6Src, dst=IPv6Dst)
-			newPacket2 = ICMPv6ND_NA(R=0, tgt=IPv6Src)
-			randomEthAddress = generateEthernetAddress()
-			newPacket3 = ICMPv6NDOptDstLLAddr(lladdr=randomEthAddress)
-			newPacket = newPacket1 / newPacket2 / newPacket3
-			packetsList.append(newPacket)
-	wrpcap(badPcap, packetsList)
-
-# Genera prefijos de red IPv6 aleatorios:
-# https://stackoverflow.com/questions/7660485/how-to-generate-random-ipv6-address-using-pythonor-in-scapy
-def generateIPv6Prefix():
-	hexBytesList = []
-	for i in range(2):
-		decimalTwoBytes = random.randint(0, 65535)	# De 0 a (2^16bits - 1)
-		hexTwoBytes = '%02x' % decimalTwoBytes
-		hexBytesList.append(hexTwoBytes)
-	IPv6Prefix = "2001:db8:" + ":" .join(hexBytesList) + "::"
-	return IPv6Prefix
+def neighbourCacheAttackWithNA(goodPcap, badPcap, workers=1, seed=None, engine="template"):
+	generateAttack(goodPcap, badPcap, "NA", workers, seed, engine)
 
 # Para cada paquete de una captura (buena), crea uno nuevo en otra captura
 # (mala) configurando erróneamente la dirección global IPv6 de la máquina
 # destino (con una dirección aleatoria, ataque DoS).
 # -- Con mensajes RA --
-def wrongGlobalIPv6AddressWithRA(goodPcap, badPcap):
-	packets = rdpcap(goodPcap)
-	packetsList = []
-	for packet in packets:
-		if IPv6 in packet:
-			IPv6Src = packet[IPv6].src
-			newPacket1 = IPv6(src=IPv6Src, dst="ff02::1")
-			newPacket2 = ICMPv6ND_RA(M=0, O=0)
-			ramdomIPv6Prefix = generateIPv6Prefix()
-			newPacket3 = ICMPv6NDOptPrefixInfo(prefixlen=64, prefix=ramdomIPv6Prefix, L=1, A=1)
-			newPacket = newPacket1 / newPacket2 / newPacket3
-			packetsList.append(newPacket)
-	wrpcap(badPcap, packetsList)
+def wrongGlobalIPv6AddressWithRA(goodPcap, badPcap, workers=1, seed=None, engine="template"):
+	generateAttack(goodPcap, badPcap, "RA", workers, seed, engine)
 
 # Procesa la opción elegida por el usuario.
-def processOption(num, goodPcap, badPcap):
+def processOption(num, goodPcap, badPcap, workers=1, seed=None, engine="template"):
 	if num == "1":
-		neighbourCacheAttackWithNS(goodPcap, badPcap)
+		neighbourCacheAttackWithNS(goodPcap, badPcap, workers, seed, engine)
 	elif num == "2":
-		neighbourCacheAttackWithNA(goodPcap, badPcap)
+		neighbourCacheAttackWithNA(goodPcap, badPcap, workers, seed, engine)
 	elif num == "3":
-		wrongGlobalIPv6AddressWithRA(goodPcap, badPcap)
+		wrongGlobalIPv6AddressWithRA(goodPcap, badPcap, workers, seed, engine)
 	else:
 		print("Esa opción no existe")
 		sys.exit()
 
-goodPcap, badPcap = checkExecution()
-showMenu()
-num = getOption()
-processOption(num, goodPcap, badPcap)
+# Los procesos de multiprocessing importan este fichero: el programa solo se
+# ejecuta desde el proceso principal.
+if __name__ == "__main__":
+	goodPcap, badPcap, workers, seed, engine, batch = checkExecution()
+	if batch is not None:
+		batchAttacks(goodPcap, badPcap, batch, workers, seed, engine)
+	else:
+		showMenu()
+		num = getOption()
+		processOption(num, goodPcap, badPcap, workers, seed, engine)
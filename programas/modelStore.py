@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa auxiliar para guardar la red neuronal ya entrenada y volver a
+# cargarla, sin tener que entrenarla otra vez cada vez que se quiere
+# clasificar tráfico nuevo.
+#
+# El modelo se guarda con Keras (fichero .keras) y, a su lado, un fichero
+# .json con sus metadatos: el número de bytes por paquete ([numFeatures]) con
+# el que se ha entrenado y que hay que extraer del tráfico a clasificar.
+#
+# Keras solo se importa al cargar un modelo .keras: los modelos exportados a
+# .npz (ver numpyModel.py) se cargan y se ejecutan solo con NumPy.
+
+# ENTRADAS:
+# model => red neuronal (de Keras) ya entrenada.
+# numFeatures => número de bytes que caracterizan a cada uno de los paquetes.
+# modelPath => fichero .keras donde se guarda el modelo (o .npz exportado).
+
+# SALIDAS:
+# 1. Fichero [modelPath] con el modelo y [modelPath].json con sus metadatos.
+# 2. Al cargarlo, el modelo y el diccionario de metadatos.
+
+# EJEMPLO DE EJECUCIÓN:
+# import modelStore
+# modelStore.saveModel(model, 88, "modelo-ipv6-NS.keras")
+# model, metadata = modelStore.loadModel("modelo-ipv6-NS.keras")
+###############################################################################
+
+import numpyModel
+import json
+import os
+
+# Devuelve el fichero de metadatos de un modelo.
+def metadataPath(modelPath):
+	return modelPath + ".json"
+
+# Guarda el modelo en [modelPath] junto con sus metadatos: [numFeatures] y
+# cualquier otro valor que se indique en [metadata].
+def saveModel(model, numFeatures, modelPath, **metadata):
+	model.save(modelPath)
+	metadata["numFeatures"] = numFeatures
+	tmp = metadataPath(modelPath) + ".tmp-" + str(os.getpid())
+	with open(tmp, "w") as f:
+		json.dump(metadata, f, indent=4)
+	os.replace(tmp, metadataPath(modelPath))
+
+# Carga el modelo de [modelPath] y sus metadatos. Da un ValueError si faltan
+# los metadatos o no cuadran con el modelo. Los .npz se cargan con el motor de
+# numpyModel.py, que tiene el mismo predict_on_batch() que Keras.
+def loadModel(modelPath):
+	if modelPath.endswith(".npz"):
+		return numpyModel.loadEngine(modelPath)
+	from keras import models
+
+	if not os.path.exists(metadataPath(modelPath)):
+		raise ValueError("no se encuentran los metadatos del modelo: " + metadataPath(modelPath))
+	with open(metadataPath(modelPath)) as f:
+		metadata = json.load(f)
+	model = models.load_model(modelPath)
+	if model.input_shape[-1] != metadata.get("numFeatures"):
+		raise ValueError(modelPath + ": el modelo espera " + str(model.input_shape[-1]) +
+			" bytes por paquete y sus metadatos indican " + str(metadata.get("numFeatures")))
+	return model, metadata
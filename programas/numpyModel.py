@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa que exporta la red neuronal ya entrenada (las capas Dense de
+# buildNN() en NNForNetworkTraffic.py) a un fichero .npz con sus pesos, y la
+# ejecuta solo con NumPy: relu en las capas ocultas y sigmoid en la de salida.
+#
+# Para clasificar tráfico con una red tan pequeña (unos miles de pesos) no
+# hace falta cargar Keras ni TensorFlow, que tardan varios segundos en
+# arrancar y ocupan cientos de MB. scoreTraffic.py y scoreLiveTraffic.py usan
+# este motor cuando el modelo que se les pasa es un .npz.
+#
+# Si los paquetes llegan como bytes (uint8), la normalización (/ 255) va
+# incluida en los pesos de la primera capa, así que no hay que convertirlos
+# antes a float32 entre 0 y 1.
+
+# ENTRADAS:
+# [model.keras] => modelo guardado por NNForNetworkTraffic.py (con su .json).
+# [model.npz] => fichero donde se exporta el modelo (o de donde se carga).
+# [inputFile] => (bench) paquetes con los que comparar los dos motores: .txt,
+#				 .npy o captura .pcap/.pcapng.
+# [batch] => (bench, opcional) paquetes por lote (8192).
+
+# SALIDAS:
+# 1. (export) Fichero [model.npz] con los pesos y los metadatos del modelo.
+# 2. (bench) Diferencia máxima entre las puntuaciones de Keras y de NumPy,
+# tiempo de arranque en frío (importar, cargar el modelo y clasificar el
+# primer lote, en un proceso nuevo) y paquetes por segundo de cada motor.
+
+# EJEMPLO DE EJECUCIÓN:
+# python3 numpyModel.py export modelo-ipv6-NS.keras modelo-ipv6-NS.npz
+# python3 numpyModel.py bench modelo-ipv6-NS.keras modelo-ipv6-NS.npz cap-ipv6-test.txt [batch=8192]
+###############################################################################
+
+import numpy as np
+import subprocess
+import json
+import time
+import sys
+import os
+
+# Funciones de activación que sabe ejecutar el motor.
+ACTIVATIONS = {
+	"relu": lambda z: np.maximum(z, 0, out=z),
+	"sigmoid": lambda z: 1 / (1 + np.exp(-np.clip(z, -60, 60, out=z), out=z)),
+	"linear": lambda z: z,
+}
+
+# Comprueba si se ha ejecutado bien el programa. Si está bien ejecutado,
+# devuelve el modo ("export" o "bench"), sus ficheros y las opciones.
+def checkExecution():
+	options = {"batch": "8192"}
+	mode = sys.argv[1] if len(sys.argv) > 1 else None
+	files = 2 if mode == "export" else 3
+	optionsArgv = [arg.split("=")[0] for arg in sys.argv[2 + files:]]
+	if mode not in ("export", "bench") or len(sys.argv) < 2 + files or \
+			not all(key in options for key in optionsArgv):
+		print("usage: python3 numpyModel.py export [model.keras] [model.npz]")
+		print("       python3 numpyModel.py bench [model.keras] [model.npz] [inputFile] [batch=[packets]]")
+		sys.exit(1)
+	for arg in sys.argv[2 + files:]:
+		key, value = arg.split("=", 1)
+		options[key] = value
+	return mode, sys.argv[2:2 + files], options
+
+# Red neuronal de capas Dense ejecutada con NumPy. Tiene el mismo
+# predict_on_batch() que un modelo de Keras.
+class NumpyMLP:
+	def __init__(self, weights, biases, activations):
+		self.weights = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+		self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+		self.activations = activations
+		self.input_shape = (None, self.weights[0].shape[0])
+		self.bytesWeights = self.weights[0] * np.float32(1 / 255)	# Primera capa para bytes (uint8).
+
+	# Devuelve la puntuación (0-1) de cada muestra, como una matriz (X, 1).
+	# Las muestras pueden estar normalizadas (float) o ser los bytes (uint8).
+	def predict_on_batch(self, x):
+		first = self.bytesWeights if x.dtype == np.uint8 else self.weights[0]
+		z = x.astype(np.float32, copy=False) @ first
+		z += self.biases[0]
+		z = ACTIVATIONS[self.activations[0]](z)
+		for w, b, activation in zip(self.weights[1:], self.biases[1:], self.activations[1:]):
+			z = z @ w
+			z += b
+			z = ACTIVATIONS[activation](z)
+		return z
+
+# Exporta las capas Dense de un modelo de Keras a [npzPath], junto con sus
+# metadatos (los de modelStore.py). Da un ValueError si el modelo tiene capas
+# o activaciones que el motor no sabe ejecutar, o si no calcula en float32
+# (precision=bfloat16 en NNForNetworkTraffic.py): el motor daría otras
+# puntuaciones.
+def exportModel(model, metadata, npzPath):
+	arrays = {}
+	activations = []
+	for i, layer in enumerate(model.layers):
+		config = layer.get_config()
+		if type(layer).__name__ != "Dense" or config.get("activation") not in ACTIVATIONS:
+			raise ValueError("capa no soportada: " + layer.name + " (" + type(layer).__name__ + ", " +
+				str(config.get("activation")) + ")")
+		computeDtype = layer.dtype_policy.compute_dtype
+		if computeDtype != "float32":
+			raise ValueError("capa " + layer.name + " en " + computeDtype + ": solo se pueden exportar " +
+				"modelos entrenados con precision=float32")
+		kernel, bias = layer.get_weights()
+		arrays["kernel" + str(i)] = kernel.astype(np.float32)
+		arrays["bias" + str(i)] = bias.astype(np.float32)
+		activations.append(config.get("activation"))
+	metadata = dict(metadata, activations=activations)
+	tmp = npzPath + ".tmp-" + str(os.getpid()) + ".npz"
+	np.savez(tmp, metadata=np.array(json.dumps(metadata)), **arrays)
+	os.replace(tmp, npzPath)
+
+# Carga un modelo exportado. Devuelve el motor y los metadatos.
+def loadEngine(npzPath):
+	with np.load(npzPath) as data:
+		metadata = json.loads(str(data["metadata"]))
+		layers = len(metadata["activations"])
+		engine = NumpyMLP([data["kernel" + str(i)] for i in range(layers)],
+			[data["bias" + str(i)] for i in range(layers)], metadata["activations"])
+	if engine.input_shape[-1] != metadata.get("numFeatures"):
+		raise ValueError(npzPath + ": el modelo espera " + str(engine.input_shape[-1]) +
+			" bytes por paquete y sus metadatos indican " + str(metadata.get("numFeatures")))
+	return engine, metadata
+
+# Devuelve los segundos que tarda un proceso nuevo en cargar el modelo y
+# clasificar un lote (arranque en frío). El proceso se ejecuta en el
+# directorio de este programa (para importar modelStore.py), así que recibe la
+# ruta absoluta del modelo. Da un ValueError con su salida de errores si falla.
+def coldStart(modelPath, numFeatures, batchSize):
+	code = ("import time; start = time.perf_counter(); import modelStore, numpy as np; " +
+		"model, _ = modelStore.loadModel(" + repr(os.path.abspath(modelPath)) + "); " +
+		"model.predict_on_batch(np.zeros((" + str(batchSize) + ", " + str(numFeatures) + "), dtype=np.float32)); " +
+		"print(time.perf_counter() - start)")
+	start = time.perf_counter()
+	try:
+		result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+			cwd=os.path.dirname(os.path.abspath(__file__)), env=dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3"))
+	except subprocess.CalledProcessError as e:
+		lines = e.stderr.strip().splitlines()
+		raise ValueError("no se ha podido medir el arranque en frío de " + modelPath + ": " +
+			(lines[-1] if lines else "código de salida " + str(e.returncode)))
+	return time.perf_counter() - start, float(result.stdout.split()[-1])
+
+# Clasifica los lotes con un motor y devuelve las puntuaciones y los paquetes
+# por segundo.
+def scoreAll(model, batches):
+	scores = []
+	start = time.perf_counter()
+	for x in batches:
+		scores.append(np.reshape(model.predict_on_batch(x), -1))
+	elapsed = max(time.perf_counter() - start, 1e-9)
+	scores = np.concatenate(scores) if scores else np.zeros(0)
+	return scores, len(scores) / elapsed
+
+# Compara los dos motores: misma puntuación (dentro de la tolerancia de
+# float32), arranque en frío y paquetes por segundo.
+def benchmark(kerasPath, npzPath, inputFile, batchSize):
+	import modelStore
+	import streamDataset as sds
+
+	model, metadata = modelStore.loadModel(kerasPath)
+	engine, _ = loadEngine(npzPath)
+	numFeatures = metadata["numFeatures"]
+	batches = list(sds.iterBatches(inputFile, numFeatures, batchSize))
+	normalized = [x.astype(np.float32) * (1 / 255) for x in batches]
+	model.predict_on_batch(normalized[0])							# Primera llamada: compila el modelo.
+	kerasScores, kerasRate = scoreAll(model, normalized)
+	numpyScores, numpyRate = scoreAll(engine, batches)
+	diff = float(np.max(np.abs(kerasScores - numpyScores))) if len(kerasScores) else 0.0
+	print("· " + str(len(numpyScores)) + " paquetes, diferencia máxima Keras/NumPy = " + "%.2e" % diff +
+		(" (dentro de la tolerancia)" if diff <= 1e-4 else " (¡FUERA DE LA TOLERANCIA!)"))
+	for name, path, rate in [("Keras", kerasPath, kerasRate), ("NumPy", npzPath, numpyRate)]:
+		total, ready = coldStart(path, numFeatures, batchSize)
+		print("· " + name + ": arranque en frío " + "%.2f" % total + " s (" + "%.2f" % ready +
+			" s dentro de Python), " + "%.0f" % rate + " paquetes/s")
+
+if __name__ == "__main__":
+	mode, files, options = checkExecution()
+	import modelStore
+	try:
+		if mode == "export":
+			model, metadata = modelStore.loadModel(files[0])
+			exportModel(model, metadata, files[1])
+			print("· Modelo exportado a " + files[1] + " (" + "%.1f" % (os.path.getsize(files[1]) / 1024) + " KiB)")
+		else:
+			benchmark(files[0], files[1], files[2], int(options["batch"]))
+	except (OSError, ValueError) as e:
+		print("Error: " + str(e))
+		sys.exit(1)
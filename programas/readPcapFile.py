@@ -0,0 +1,282 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa auxiliar con funciones para leer directamente las capturas .pcap y
+# .pcapng (sin tshark ni Scapy): se leen las cabeceras de cada registro y se
+# devuelven los bytes de cada trama tal cual están en la captura.
+#
+# Se utiliza en fromPcapToNpy.py para sacar los [numFeatures] primeros bytes de
+# cada paquete a una matriz uint8, sin pasar por el volcado hexadecimal de
+# fromPcapToTxt.sh.
+
+# ENTRADAS:
+# pcapFile => captura .pcap o .pcapng.
+# numFeatures => número de bytes que caracterizan a cada uno de los paquetes.
+# packetsRange => (opcional) filtro con el rango de paquetes, con la misma
+#				  sintaxis que en fromPcapToTxt.sh ("frame.number <= 1000").
+
+# SALIDAS:
+# Matriz uint8 (paquetes x numFeatures) con los primeros bytes de cada paquete,
+# rellenando con ceros los paquetes más cortos.
+
+# EJEMPLO DE EJECUCIÓN:
+# import readPcapFile as rpcap
+# rpcap.extractFeatures("captura.pcap", 50, "frame.number <= 1000")
+###############################################################################
+
+import collections
+import itertools
+import numpy as np
+import struct
+import time
+import re
+
+# Números mágicos de las cabeceras de pcap y pcapng.
+PCAP_MICRO = 0xa1b2c3d4
+PCAP_NANO = 0xa1b23c4d
+PCAPNG_SHB = 0x0a0d0d0a
+PCAPNG_BYTE_ORDER = 0x1a2b3c4d
+
+# Tipos de bloque de pcapng con paquetes y con interfaces.
+PCAPNG_IDB = 1
+PCAPNG_OPB = 2
+PCAPNG_SPB = 3
+PCAPNG_EPB = 6
+
+# Trama leída de la captura: [seconds] + [fraction] / [resolution] es su
+# instante de captura y [wirelen] su tamaño original (puede ser mayor que
+# len(data) si la captura se hizo con snaplen).
+Frame = collections.namedtuple("Frame", ["number", "linktype", "seconds", "fraction",
+	"resolution", "data", "wirelen"])
+
+# Error en el formato de la captura.
+class PcapError(Exception):
+	pass
+
+# Lee exactamente [size] bytes (o menos si se acaba el fichero).
+def readBytes(f, size):
+	data = f.read(size)
+	while len(data) < size:
+		more = f.read(size - len(data))
+		if not more:
+			break
+		data += more
+	return data
+
+# Recorre las tramas de una captura .pcap (ya leída su cabecera global).
+def iterPcapRecords(f, header):
+	magic = struct.unpack("<I", header[:4])[0]
+	endian = "<" if magic in (PCAP_MICRO, PCAP_NANO) else ">"
+	magic = struct.unpack(endian + "I", header[:4])[0]
+	resolution = 1000000000 if magic == PCAP_NANO else 1000000
+	linktype = struct.unpack(endian + "I", header[20:24])[0] & 0x0fffffff
+	recordHeader = struct.Struct(endian + "IIII")
+	number = 0
+	while True:
+		raw = readBytes(f, 16)
+		if len(raw) < 16:
+			return								# Fin de la captura (o registro cortado).
+		seconds, fraction, caplen, wirelen = recordHeader.unpack(raw)
+		data = readBytes(f, caplen)
+		if len(data) < caplen:
+			return
+		number += 1
+		yield Frame(number, linktype, seconds, fraction, resolution, data, wirelen)
+
+# Devuelve la resolución (unidades por segundo) de las marcas de tiempo de una
+# interfaz de pcapng, según su opción if_tsresol (por defecto, microsegundos).
+def interfaceResolution(options, endian):
+	offset = 0
+	while offset + 4 <= len(options):
+		code, length = struct.unpack(endian + "HH", options[offset:offset + 4])
+		if code == 0:
+			break
+		if code == 9 and length >= 1:
+			value = options[offset + 4]
+			return 2 ** (value & 0x7f) if value & 0x80 else 10 ** value
+		offset += 4 + (length + 3) // 4 * 4
+	return 1000000
+
+# Recorre las tramas de una captura .pcapng. Cada sección (SHB) indica el
+# orden de sus bytes y sus interfaces (IDB) el tipo de enlace y la resolución
+# de las marcas de tiempo de cada trama.
+def iterPcapngRecords(f):
+	number = 0
+	interfaces = []
+	endian = "<"
+	while True:
+		head = readBytes(f, 8)
+		if len(head) < 8:
+			return								# Fin de la captura (o bloque cortado).
+		blockType = struct.unpack(endian + "I", head[:4])[0]
+		if blockType == PCAPNG_SHB:				# Mismo valor en los dos órdenes de bytes.
+			byteOrder = readBytes(f, 4)
+			endian = "<" if struct.unpack("<I", byteOrder)[0] == PCAPNG_BYTE_ORDER else ">"
+			interfaces = []
+		blockLen = struct.unpack(endian + "I", head[4:8])[0]
+		if blockLen < 12 or blockLen % 4:
+			raise PcapError("bloque pcapng con longitud inválida: " + str(blockLen))
+		rest = readBytes(f, blockLen - 8 - (4 if blockType == PCAPNG_SHB else 0))
+		if len(rest) < blockLen - 8 - (4 if blockType == PCAPNG_SHB else 0):
+			return
+		body = rest[:-4]						# Sin la longitud repetida al final del bloque.
+
+		if blockType == PCAPNG_IDB:
+			linktype, _, snaplen = struct.unpack(endian + "HHI", body[:8])
+			interfaces.append((linktype, snaplen, interfaceResolution(body[8:], endian)))
+		elif blockType in (PCAPNG_EPB, PCAPNG_OPB):
+			if blockType == PCAPNG_EPB:
+				ifId, high, low, caplen, wirelen = struct.unpack(endian + "IIIII", body[:20])
+			else:
+				ifId, _, high, low, caplen, wirelen = struct.unpack(endian + "HHIIII", body[:20])
+			linktype, _, resolution = interfaces[ifId]
+			timestamp = (high << 32) | low
+			number += 1
+			yield Frame(number, linktype, timestamp // resolution, timestamp % resolution,
+				resolution, body[20:20 + caplen], wirelen)
+		elif blockType == PCAPNG_SPB:
+			linktype, snaplen, resolution = interfaces[0]
+			wirelen = struct.unpack(endian + "I", body[:4])[0]
+			caplen = min(wirelen, snaplen) if snaplen else wirelen
+			number += 1
+			yield Frame(number, linktype, 0, 0, resolution, body[4:4 + caplen], wirelen)
+
+# Fichero que devuelve primero unos bytes ya leídos y luego el resto del fichero.
+class PrefixedReader:
+	def __init__(self, prefix, f):
+		self.prefix = prefix
+		self.f = f
+
+	def read(self, size):
+		if not self.prefix:
+			return self.f.read(size)
+		data, self.prefix = self.prefix[:size], self.prefix[size:]
+		if len(data) < size:
+			data += self.f.read(size - len(data))
+		return data
+
+# Fichero que sigue creciendo mientras se lee (una captura que se está
+# escribiendo, como con "tail -f"): si faltan bytes, espera [poll] segundos y
+# vuelve a intentarlo. Deja de esperar (y devuelve lo que tenga) cuando pasan
+# [idle] segundos sin datos nuevos (0 para esperar siempre) o cuando se activa
+# el evento [stop].
+class FollowReader:
+	def __init__(self, f, poll=0.05, idle=0, stop=None):
+		self.f = f
+		self.poll = poll
+		self.idle = idle
+		self.stop = stop
+
+	def read(self, size):
+		data = self.f.read(size)
+		waitStart = time.monotonic()
+		while len(data) < size:
+			if self.stop is not None and self.stop.is_set():
+				break
+			if self.idle and time.monotonic() - waitStart >= self.idle:
+				break
+			time.sleep(self.poll)
+			more = self.f.read(size - len(data))
+			if more:
+				data += more
+				waitStart = time.monotonic()
+		return data
+
+# Recorre las tramas de una captura .pcap o .pcapng abierta en modo binario,
+# según el número mágico de su cabecera.
+def iterFrames(f):
+	header = readBytes(f, 24)
+	if len(header) < 4:
+		return
+	magic = struct.unpack("<I", header[:4])[0]
+	magicBigEndian = struct.unpack(">I", header[:4])[0]
+	if magic == PCAPNG_SHB:
+		yield from iterPcapngRecords(PrefixedReader(header, f))
+	elif magic in (PCAP_MICRO, PCAP_NANO) or magicBigEndian in (PCAP_MICRO, PCAP_NANO):
+		if len(header) < 24:
+			raise PcapError("cabecera pcap incompleta")
+		yield from iterPcapRecords(f, header)
+	else:
+		raise PcapError("no es una captura pcap/pcapng (número mágico " + hex(magic) + ")")
+
+# Devuelve el tipo de enlace de la primera trama de una captura o, si no
+# tiene tramas, [default] (como wrpcap(), que escribe Ethernet).
+def firstLinktype(pcapFile, default=None):
+	with open(pcapFile, "rb") as f:
+		frame = next(iterFrames(f), None)
+	return default if frame is None else frame.linktype
+
+# Convierte el filtro de rango de paquetes de fromPcapToTxt.sh en el primer y
+# el último número de trama (None si no hay límite superior). Se admiten
+# condiciones "frame.number [<, <=, >, >=, ==] N" unidas con "&&" o "and".
+def parsePacketsRange(packetsRange):
+	first, last = 1, None
+	if not packetsRange or not packetsRange.strip():
+		return first, last
+	for clause in re.split(r"&&|\band\b", packetsRange):
+		match = re.fullmatch(r"\s*\(?\s*frame\.number\s*(<=|>=|==|<|>|le|ge|eq|lt|gt)\s*(\d+)\s*\)?\s*", clause)
+		if not match:
+			raise ValueError("filtro no soportado: " + clause.strip())
+		op = {"le": "<=", "ge": ">=", "eq": "==", "lt": "<", "gt": ">"}.get(match.group(1), match.group(1))
+		n = int(match.group(2))
+		if op in ("<=", "<", "=="):
+			bound = n if op != "<" else n - 1
+			last = bound if last is None else min(last, bound)
+		if op in (">=", ">", "=="):
+			first = max(first, n if op != ">" else n + 1)
+	return first, last
+
+# Recorre las tramas de una captura dentro del rango de paquetes indicado.
+def iterCapture(pcapFile, packetsRange=None):
+	first, last = parsePacketsRange(packetsRange)
+	with open(pcapFile, "rb") as f:
+		for frame in iterFrames(f):
+			if last is not None and frame.number > last:
+				return							# Las tramas van en orden: no hace falta seguir.
+			if frame.number >= first:
+				yield frame
+
+# Devuelve la matriz uint8 con los [numFeatures] primeros bytes de un conjunto
+# de tramas, rellenando con ceros las más cortas.
+def framesToMatrix(frames, numFeatures):
+	rows = b"".join(frame.data[:numFeatures].ljust(numFeatures, b"\0") for frame in frames)
+	return np.frombuffer(bytearray(rows), dtype=np.uint8).reshape(-1, numFeatures)
+
+# Devuelve la matriz uint8 con los [numFeatures] primeros bytes de cada
+# paquete de la captura dentro del rango indicado.
+def extractFeatures(pcapFile, numFeatures, packetsRange=None):
+	return framesToMatrix(iterCapture(pcapFile, packetsRange), numFeatures)
+
+# Recorre por bloques (matrices uint8 de hasta [blockRows] paquetes) los
+# [numFeatures] primeros bytes de los paquetes de una captura, sin cargarla
+# entera en memoria.
+def iterFeatureBlocks(pcapFile, numFeatures, packetsRange=None, blockRows=65536):
+	frames = iterCapture(pcapFile, packetsRange)
+	while True:
+		block = framesToMatrix(itertools.islice(frames, blockRows), numFeatures)
+		if not len(block):
+			return
+		yield block
+
+# Escribe la cabecera global de una captura .pcap igual que wrpcap() de Scapy
+# (microsegundos, orden de bytes de la máquina y snaplen 65535).
+def writePcapHeader(f, linktype):
+	f.write(struct.pack("=IHHIIII", PCAP_MICRO, 2, 4, 0, 0, 65535, linktype))
+
+# Devuelve los microsegundos de la marca de tiempo de una trama, redondeados
+# como Scapy al escribir (al par más cercano en caso de empate).
+def frameMicroseconds(frame):
+	if frame.resolution == 1000000:
+		return frame.fraction
+	usec, rest = divmod(frame.fraction * 1000000, frame.resolution)
+	if 2 * rest > frame.resolution or (2 * rest == frame.resolution and usec % 2):
+		usec += 1
+	return usec
+
+# Escribe una trama en una captura .pcap (como wrpcap()), con la marca de
+# tiempo de [frame] y los bytes de [data]. El tamaño original es [wirelen] o,
+# si no se indica, el de [frame].
+def writePcapRecord(f, frame, data, wirelen=None):
+	wirelen = frame.wirelen if wirelen is None else wirelen
+	f.write(struct.pack("=IIII", frame.seconds, frameMicroseconds(frame), len(data), wirelen))
+	f.write(data)
@@ -10,80 +10,223 @@
 # la función createDataset().
 
 # ENTRADAS:
-# origTxt => fichero .txt con la parte de tráfico "bueno".
-# modTxt => fichero .txt con la parte de tráfico modificado (tráfico "malo").
+# origTxt => fichero .txt (o .npy) con la parte de tráfico "bueno".
+# modTxt => fichero .txt (o .npy) con la parte de tráfico modificado (tráfico "malo").
 # numFeatures => número de bytes que caracterizan a cada uno de los paquetes.
+# cacheDir => (opcional) directorio de la caché en disco (ver datasetCache.py).
+# cacheBytes => (opcional) tamaño máximo de la caché en disco.
 
 # SALIDAS:
-# Devuelve el training/validation/test set resultante en 2 variables:
-# 1. Matriz de muestras de tráfico del subconjunto en cuestión.
-# 2. Vector con las etiquetas correspondientes a cada paquete.
+# Devuelve el training/validation/test set resultante como un PacketDataset:
+# 1. Matrices uint8 con las muestras de tráfico "bueno" y "malo".
+# 2. Orden mezclado de las muestras, del que se sacan los lotes (normalizados a
+#	 float32) y el vector con las etiquetas correspondientes a cada paquete.
 
 # EJEMPLO DE EJECUCIÓN:
 # import readTxtFile as rtxt
 # rtxt.createDataset("cap-ipv6-train.txt", "cap-ipv6-train-NS.txt", 88)
 ###############################################################################
 
+import datasetCache as cache
+import stageProfiler as prof
 import numpy as np
+import time
 
-# Devuelve el número de líneas de un fichero.
-def countLines(filepath):
-	f = open(filepath, "r")
-	counter = 0
-	for line in f:
-		counter += 1
-	f.close()
-	return counter
-
-# Devuelve la matriz de ceros rellenada con los bytes en decimal.
-def fillData(filepath, numFeatures, data):
-	f = open(filepath, "r")
-	i, j = 0, 0
-	for line in f:
-		hexData = line.split(" ")[:numFeatures]		# ['ff', 'b7', 'aa', '00', 'a2', ...] (hasta 50).
-		for pairHex in hexData:						# len(hexData) = nº de bytes en el paquete.
-			try:
-				decData = int(pairHex, 16)			# hexData => decData.
-			except ValueError as e:
-				# j += 1							# Seguimos con el mismo indice de j (omitimos que nos hemos encontrado caracteres especiales).
-				continue							# Si Wireshark ha introducido caracteres no hexadecimales, nos los saltamos.
-			decDataNorm = decData / 255				# decData normalizado.
-			data[i, j] = decDataNorm
-			j += 1
-		j = 0
-		i += 1
-	f.close()
+# Tamaño (en bytes) de cada bloque de texto que se decodifica de una vez.
+TAM_BLOQUE = 1 << 22
+
+# Tabla de traducción de cada carácter ASCII a su valor hexadecimal (255 si no
+# es un dígito hexadecimal).
+def buildHexTable():
+	table = np.full(256, 255, dtype=np.uint8)
+	for value, char in enumerate(b"0123456789abcdef"):
+		table[char] = value
+	for value, char in enumerate(b"ABCDEF"):
+		table[char] = value + 10
+	return table
+
+HEX_TABLE = buildHexTable()
+
+# Decodifica un array de bytes con líneas completas (terminado en "\n") a una
+# matriz uint8 (una fila por línea), de forma vectorizada con NumPy.
+# Se mantiene el comportamiento de la versión anterior (línea a línea):
+#	- Solo se miran los [numFeatures] primeros campos separados por " ".
+#	- Los campos que no son hexadecimales se saltan sin ocupar columna.
+#	- Los paquetes más cortos que [numFeatures] se rellenan con ceros.
+# Los campos de más de 2 dígitos no caben en un byte y se tratan como no
+# hexadecimales (tshark -x nunca los genera).
+def decodeFields(buf, numFeatures):
+	seps = np.flatnonzero((buf == 32) | (buf == 10))		# Posiciones de " " y "\n" (fin de cada campo).
+	isNewline = buf[seps] == 10
+	numLines = int(np.count_nonzero(isNewline))
+	data = np.zeros((numLines, numFeatures), dtype=np.uint8)
+	if numLines == 0:
+		return data
+
+	# Cada campo va desde el separador anterior hasta el suyo (puede estar vacío).
+	starts = np.empty(len(seps), dtype=np.intp)
+	starts[0] = 0
+	starts[1:] = seps[:-1] + 1
+	lengths = seps - starts
+
+	# Línea de cada campo y su número de campo dentro de la línea. Solo se
+	# decodifican los [numFeatures] primeros campos de cada línea.
+	lineOf = np.cumsum(isNewline) - isNewline
+	firstField = np.concatenate(([0], np.flatnonzero(isNewline)[:-1] + 1))
+	inRange = np.flatnonzero(np.arange(len(seps)) - firstField[lineOf] < numFeatures)
+	starts, lengths, lineOf = starts[inRange], lengths[inRange], lineOf[inRange]
+
+	# Los dígitos se traducen con la tabla (se lee fuera del bloque solo en el
+	# último campo y, en ese caso, es el "\n" final).
+	high = HEX_TABLE[buf[np.minimum(starts, len(buf) - 1)]]
+	low = HEX_TABLE[buf[np.minimum(starts + 1, len(buf) - 1)]]
+	isHex = ((lengths == 2) & ((high | low) < 16)) | ((lengths == 1) & (high < 16))
+	values = np.where(lengths == 2, (high << 4) | (low & 15), high)
+
+	# Columna = nº de campos hexadecimales anteriores dentro de la misma línea.
+	keptBefore = np.cumsum(isHex) - isHex
+	lineStart = np.concatenate(([True], lineOf[1:] != lineOf[:-1]))
+	firstKept = np.maximum.accumulate(np.where(lineStart, keptBefore, 0))
+	cols = keptBefore - firstKept
+	data[lineOf[isHex], cols[isHex]] = values[isHex]
 	return data
 
-# Crea un dataset de muestras (bytes de paquetes) y sus correspondientes salidas (0 o 1).
-def createDataset(origTxt, modTxt, numFeatures):
-	# Calculamos el número de paquetes que hay en la captura (una línea con los bytes por paquete).
-	numPackets = countLines(origTxt)
+# Decodifica un bloque de líneas completas (terminado en "\n"). Como tshark
+# vuelca el paquete entero en cada línea, se recorta cada línea a los
+# 3 * [numFeatures] primeros caracteres ("xx " por byte), que es donde están los
+# campos que interesan. Las líneas con el formato normal ("xx xx ... xx") se
+# traducen directamente con la tabla; el resto pasa por decodeFields() y, si
+# su campo [numFeatures] no cabe en el recorte, se decodifican completas.
+def decodeHexLines(block, numFeatures):
+	buf = np.frombuffer(block, dtype=np.uint8)
+	newlines = np.flatnonzero(buf == 10)
+	numLines = len(newlines)
+	width = 3 * numFeatures
+	if numLines == 0:
+		return np.zeros((0, numFeatures), dtype=np.uint8)
+	lineStarts = np.concatenate(([0], newlines[:-1] + 1))
+	lineLens = newlines - lineStarts
 
-	# Cargamos las muestras de tráfico normal (el de la captura original, y = 0).
-	goodData = np.zeros((numPackets, numFeatures))						# (10 x 50) 			{por ejemplo}.
-	goodDataFilled = fillData(origTxt, numFeatures, goodData)			# (10 x 50 rellenado) 	{por ejemplo}.
+	# Ventana (líneas x width) con el principio de cada línea, rellena con " ".
+	window = np.full((numLines, width + 1), 32, dtype=np.uint8)
+	window[:, width] = 10
+	inLine = np.arange(width) < np.minimum(lineLens, width)[:, None]
+	window[:, :width][inLine] = buf[(lineStarts[:, None] + np.arange(width))[inLine]]
 
-	# Cargamos las muestras de tráfico anormal (el de la captura modificada, y = 1).
-	badData = np.zeros((numPackets, numFeatures))						# (10 x 50)				{por ejemplo}.
-	badDataFilled = fillData(modTxt, numFeatures, badData)				# (10 x 50 rellenado)	{por ejemplo}.
+	# Formato normal: cada campo presente son 2 dígitos seguidos de " " (o del final de línea).
+	fields = window[:, :width].reshape(numLines, numFeatures, 3)
+	high = HEX_TABLE[fields[:, :, 0]]
+	low = HEX_TABLE[fields[:, :, 1]]
+	present = 3 * np.arange(numFeatures) < lineLens[:, None]
+	regular = ~present | (((high | low) < 16) & (fields[:, :, 2] == 32))
+	data = np.where(present, (high << 4) | (low & 15), 0).astype(np.uint8)
+
+	irregular = np.flatnonzero(~regular.all(axis=1))
+	if irregular.size > 0:
+		data[irregular] = decodeFields(window[irregular].ravel(), numFeatures)
+		cut = irregular[(lineLens[irregular] > width) &
+			(np.count_nonzero(window[irregular, :width] == 32, axis=1) < numFeatures)]
+		for line in cut:
+			data[line] = decodeFields(buf[lineStarts[line]:newlines[line] + 1], numFeatures)[0]
+	return data
 
-	# Juntamos las muestras de tráfico normal y anormal (tanto y = 0 como y = 1).
-	xAll = np.concatenate((goodDataFilled, badDataFilled), axis=0)		# (20 x 50)				{por ejemplo}.
+# Recorre un fichero .txt en bloques de líneas completas (una sola lectura) y
+# devuelve, por cada bloque, su matriz uint8 con los bytes de los paquetes.
+def iterTxtBlocks(filepath, numFeatures, blockSize=TAM_BLOQUE):
+	with open(filepath, "rb") as f:
+		rest = b""
+		while True:
+			chunk = f.read(blockSize)
+			if not chunk:
+				break
+			chunk = (rest + chunk).replace(b"\r\n", b"\n")
+			cut = chunk.rfind(b"\n") + 1
+			rest = chunk[cut:]
+			if cut > 0:
+				yield decodeHexLines(chunk[:cut], numFeatures)
+		if rest:
+			yield decodeHexLines(rest + b"\n", numFeatures)	# Última línea sin "\n" (fromPcapToTxt.sh la quita).
 
-	# Creamos las etiquetas para el tráfico normal (y = 0) y anormal (y = 1).
-	# https://stackoverflow.com/questions/22053050/difference-between-numpy-array-shape-r-1-and-r
-	yZero = np.zeros((numPackets))				# Vector (1 x 10) == (10,)						{por ejemplo}.
-	yOne = np.ones((numPackets))				# Vector (1 x 10) == (10,)						{por ejemplo}.
+# Devuelve la matriz uint8 (paquetes x numFeatures) con los bytes de un fichero
+# .txt, informando de las filas por segundo que se han procesado.
+@prof.stage("loadTxtFile", rows=len)
+def loadTxtFile(filepath, numFeatures):
+	start = time.perf_counter()
+	blocks = list(iterTxtBlocks(filepath, numFeatures))
+	if blocks:
+		data = np.concatenate(blocks, axis=0)
+	else:
+		data = np.zeros((0, numFeatures), dtype=np.uint8)
+	elapsed = max(time.perf_counter() - start, 1e-9)
+	print("· " + filepath + ": " + str(len(data)) + " paquetes en " + "%.2f" % elapsed +
+		" s (" + "%.0f" % (len(data) / elapsed) + " paquetes/s)")
+	return data
+
+# Devuelve la matriz uint8 de un fichero .npy (por ejemplo, de fromPcapToNpy.py)
+# mapeada en memoria.
+def loadNpyFile(filepath, numFeatures):
+	data = np.load(filepath, mmap_mode="r")
+	if data.dtype != np.uint8 or data.ndim != 2 or data.shape[1] != numFeatures:
+		raise ValueError(filepath + ": se esperaba una matriz uint8 (paquetes x " + str(numFeatures) +
+			") y tiene " + str(data.dtype) + " " + str(data.shape))
+	return data
+
+# Devuelve la matriz uint8 de un fichero .txt, pasando por la caché en disco
+# si se indica su directorio [cacheDir]. Los ficheros .npy ya están en binario
+# y se cargan directamente.
+def loadPackets(filepath, numFeatures, cacheDir=None, cacheBytes=cache.TAM_CACHE):
+	if filepath.endswith(".npy"):
+		data = loadNpyFile(filepath, numFeatures)
+		print("· " + filepath + ": " + str(len(data)) + " paquetes (.npy)")
+		return data
+	if cacheDir:
+		return cache.loadCached(filepath, numFeatures, loadTxtFile, cacheDir, cacheBytes)
+	return loadTxtFile(filepath, numFeatures)
+
+# Dataset compacto con los bytes de los paquetes "buenos" (y = 0) y "malos"
+# (y = 1) en uint8, sin juntarlos en una sola matriz. El orden mezclado de las
+# muestras es una permutación de índices: los índices menores que el número de
+# paquetes buenos son filas de [goodData] y el resto, filas de [badData].
+# La normalización a float32 (0-1) se hace por lotes, al pedir cada lote.
+class PacketDataset:
+	def __init__(self, goodData, badData):
+		self.goodData = goodData
+		self.badData = badData
+		self.numFeatures = goodData.shape[1]
+		self.numGood = len(goodData)
+		# https://stackoverflow.com/questions/43229034/randomly-shuffle-data-and-labels-from-different-files-in-the-same-order
+		self.order = np.random.permutation(len(goodData) + len(badData))
+
+	def __len__(self):
+		return len(self.order)
 
-	# Juntamos las etiquetas para el tráfico normal y anormal (tanto y = 0 como y = 1).
-	yAll = np.concatenate((yZero, yOne), axis=0)		# Vector (1 x 20) == (20,)				{por ejemplo}.
+	# Vuelve a mezclar el orden de las muestras (por ejemplo, al acabar cada época).
+	def shuffle(self):
+		np.random.shuffle(self.order)
 
-	# Alteramos el orden de las muestras y sus salidas para que estén mezcladas.
-	# https://stackoverflow.com/questions/43229034/randomly-shuffle-data-and-labels-from-different-files-in-the-same-order
-	idxShuffled = np.random.permutation(len(xAll))
-	xAllShuffled = xAll[idxShuffled]
-	yAllShuffled = yAll[idxShuffled]
+	# Devuelve las etiquetas (0 o 1) en el orden mezclado.
+	def getLabels(self):
+		return (self.order >= self.numGood).astype(np.float32)
+
+	# Devuelve el lote de muestras [start, stop) del orden mezclado, ya
+	# normalizado a float32, y sus etiquetas.
+	def getBatch(self, start, stop):
+		idx = self.order[start:stop]
+		isBad = idx >= self.numGood
+		x = np.empty((len(idx), self.numFeatures), dtype=np.float32)
+		x[~isBad] = self.goodData[idx[~isBad]]
+		x[isBad] = self.badData[idx[isBad] - self.numGood]
+		x *= 1 / 255
+		return x, isBad.astype(np.float32)
+
+# Crea un dataset de muestras (bytes de paquetes) y sus correspondientes salidas (0 o 1).
+@prof.stage("createDataset", rows=len)
+def createDataset(origTxt, modTxt, numFeatures, cacheDir=None, cacheBytes=cache.TAM_CACHE):
+	# Cargamos las muestras de tráfico normal (el de la captura original, y = 0).
+	goodData = loadPackets(origTxt, numFeatures, cacheDir, cacheBytes)		# (10 x 50) uint8		{por ejemplo}.
+
+	# Cargamos las muestras de tráfico anormal (el de la captura modificada, y = 1).
+	badData = loadPackets(modTxt, numFeatures, cacheDir, cacheBytes)		# (10 x 50) uint8		{por ejemplo}.
 
-	# https://stackoverflow.com/questions/39345995/how-does-python-return-multiple-values-from-a-function
-	return xAllShuffled, yAllShuffled
+	# Las muestras se mezclan a través de una permutación de índices (20,), sin copiarlas.
+	return PacketDataset(goodData, badData)
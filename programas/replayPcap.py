@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa que reproduce una captura .pcap o .pcapng ya guardada como si se
+# estuviera capturando en ese momento: escribe sus tramas en [outputFile.pcap]
+# (o por la salida estándar, como "tcpdump -U -w -") respetando el tiempo que
+# pasó entre ellas. Sirve para probar scoreLiveTraffic.py sin tráfico real.
+
+# ENTRADAS:
+# [inputFile.pcap] => captura (.pcap o .pcapng) que se reproduce.
+# [outputFile.pcap] => captura .pcap que se va escribiendo, o "-" para la
+#					   salida estándar.
+# [speed] => (opcional) velocidad de reproducción: 1 en tiempo real (por
+#			 defecto), 10 diez veces más rápido... 0 para escribirlas todas
+#			 sin esperar.
+
+# SALIDAS:
+# [outputFile.pcap] => captura .pcap (microsegundos) con las mismas tramas.
+
+# EJEMPLO DE EJECUCIÓN:
+# python3 replayPcap.py captura.pcap - speed=10 | python3 scoreLiveTraffic.py modelo-ipv6-NS.keras - -
+###############################################################################
+
+import readPcapFile as rpcap
+import time
+import sys
+
+# Comprueba si se ha ejecutado bien el programa. Si está bien ejecutado,
+# devuelve [inputFile.pcap], [outputFile.pcap] y la velocidad.
+def checkExecution():
+	options = {"speed": "1"}
+	optionsArgv = [arg.split("=")[0] for arg in sys.argv[3:]]
+	if len(sys.argv) < 3 or not all(key in options for key in optionsArgv):
+		print("usage: python3 replayPcap.py [inputFile.pcap] [outputFile.pcap|-] [speed=[x]]")
+		sys.exit(1)
+	for arg in sys.argv[3:]:
+		key, value = arg.split("=", 1)
+		options[key] = value
+	return sys.argv[1], sys.argv[2], float(options["speed"])
+
+# Escribe las tramas de [inputFile] en [out] esperando entre cada una el
+# tiempo que pasó en la captura original (dividido entre [speed]).
+def replayCapture(inputFile, out, speed):
+	rpcap.writePcapHeader(out, rpcap.firstLinktype(inputFile, 1))		# También si no hay tramas.
+	out.flush()
+	start, first = time.perf_counter(), None
+	count = 0
+	for frame in rpcap.iterCapture(inputFile):
+		if first is None:
+			first = frame.seconds + frame.fraction / frame.resolution
+		if speed > 0:
+			delay = (frame.seconds + frame.fraction / frame.resolution - first) / speed
+			time.sleep(max(start + delay - time.perf_counter(), 0))
+		rpcap.writePcapRecord(out, frame, frame.data)
+		out.flush()
+		count += 1
+	return count
+
+inputFile, outputFile, speed = checkExecution()
+out = sys.stdout.buffer if outputFile == "-" else open(outputFile, "wb")
+try:
+	count = replayCapture(inputFile, out, speed)
+except (BrokenPipeError, KeyboardInterrupt):
+	sys.exit(0)
+finally:
+	if out is not sys.stdout.buffer:
+		out.close()
+print("· " + str(count) + " tramas reproducidas", file=sys.stderr)
@@ -0,0 +1,208 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa que clasifica el tráfico según llega, con una red neuronal ya
+# entrenada y guardada por NNForNetworkTraffic.py (ver modelStore.py). Lee una
+# captura .pcap o .pcapng que se sigue escribiendo (como "tail -f") o la que
+# le llega por la entrada estándar ("tcpdump -U -w - | ..."), sin pasar por
+# fromPcapToTxt.sh.
+#
+# Un hilo lee las tramas y deja sus [numFeatures] primeros bytes en una cola
+# de tamaño limitado: si la red neuronal no da abasto, la cola se llena y el
+# lector espera (y, con él, tcpdump), en lugar de acumular paquetes en memoria.
+# El hilo principal agrupa los paquetes en lotes pequeños, que se clasifican
+# en cuanto tienen [batch] paquetes o en cuanto el primero lleva [deadline] ms
+# esperando, lo que ocurra antes.
+
+# ENTRADAS:
+# [model.keras] => modelo guardado por NNForNetworkTraffic.py (con su .json) o
+#				  exportado a .npz con numpyModel.py (sin cargar Keras).
+# [inputFile] => captura .pcap o .pcapng a seguir, o "-" para leerla de la
+#				 entrada estándar.
+# [outputFile] => fichero con la puntuación de cada paquete, o "-" para
+#				  sacarla por la salida estándar.
+# [batch] => (opcional) paquetes máximos por lote (256 por defecto).
+# [deadline] => (opcional) ms máximos que espera un paquete a que se llene su
+#				lote (20 por defecto).
+# [queue] => (opcional) paquetes que caben en la cola entre el lector y la red
+#			 neuronal (16384 por defecto).
+# [idle] => (opcional) segundos sin paquetes nuevos tras los que se deja de
+#			seguir la captura (0, por defecto, para seguirla siempre).
+# [threshold] => (opcional) puntuación a partir de la cual un paquete se
+#				 cuenta como anómalo (0.5 por defecto).
+# [report] => (opcional) segundos entre informes de latencia (10 por defecto,
+#			  0 para mostrarlo solo al final).
+
+# SALIDAS:
+# 1. Fichero [outputFile] con una línea por paquete: su número de trama y la
+# probabilidad (0-1) de que sea tráfico anómalo según la red neuronal.
+#
+# 2. Cada [report] segundos y al acabar (fin de la entrada, [idle] o Ctrl+C),
+# por la salida de errores: paquetes clasificados, anómalos, veces que la cola
+# se ha llenado y latencia de cada paquete desde que se lee hasta que se
+# clasifica (mediana, p99 y máxima).
+
+# EJEMPLO DE EJECUCIÓN:
+# tcpdump -i eth0 -U -w - | python3 scoreLiveTraffic.py modelo-ipv6-NS.keras - alertas.txt [batch=256] [deadline=20]
+# python3 scoreLiveTraffic.py modelo-ipv6-NS.keras captura.pcap - [idle=5]
+# python3 replayPcap.py captura.pcap - speed=1 | python3 scoreLiveTraffic.py modelo-ipv6-NS.keras - -
+###############################################################################
+
+import modelStore
+import numpyModel
+import readPcapFile as rpcap
+import numpy as np
+import collections
+import threading
+import signal
+import queue
+import time
+import sys
+
+TAM_LOTE = 256			# Paquetes máximos por lote.
+PLAZO_LOTE = 20			# ms máximos que espera un paquete a que se llene su lote.
+TAM_COLA = 1 << 14		# Paquetes en la cola entre el lector y la red neuronal.
+LATENCIAS = 1 << 16		# Últimas latencias con las que se calculan los percentiles.
+
+# Comprueba si se ha ejecutado bien el programa. Si está bien ejecutado,
+# devuelve [model.keras], [inputFile], [outputFile] y las opciones que se
+# hayan indicado detrás (como [opción]=[valor]).
+def checkExecution():
+	options = {"batch": str(TAM_LOTE), "deadline": str(PLAZO_LOTE), "queue": str(TAM_COLA),
+		"idle": "0", "threshold": "0.5", "report": "10"}
+	optionsArgv = [arg.split("=")[0] for arg in sys.argv[4:]]
+	if len(sys.argv) < 4 or not all(key in options for key in optionsArgv):
+		print("usage: python3 scoreLiveTraffic.py [model.keras] [inputFile|-] [outputFile|-] " +
+			"[batch=[packets]] [deadline=[ms]] [queue=[packets]] [idle=[s]] " +
+			"[threshold=[0-1]] [report=[s]]")
+		sys.exit(1)
+	for arg in sys.argv[4:]:
+		key, value = arg.split("=", 1)
+		options[key] = value
+	return sys.argv[1], sys.argv[2], sys.argv[3], options
+
+# Estadísticas del clasificador, compartidas con el hilo lector.
+def newStats():
+	return {"packets": 0, "anomalous": 0, "full": 0,
+		"latencies": collections.deque(maxlen=LATENCIAS), "start": time.perf_counter()}
+
+# Lee las tramas de [inputFile] (siguiendo la captura si crece) y deja en la
+# cola el número de trama, sus [numFeatures] primeros bytes y el instante en
+# que se ha leído. Si la cola está llena, espera a que haya hueco.
+def readPackets(inputFile, numFeatures, packets, stats, stop, idle):
+	end = None
+	try:
+		f = sys.stdin.buffer if inputFile == "-" else open(inputFile, "rb")
+		if inputFile != "-":
+			f = rpcap.FollowReader(f, idle=idle, stop=stop)
+		for frame in rpcap.iterFrames(f):
+			item = (frame.number, frame.data[:numFeatures].ljust(numFeatures, b"\0"), time.perf_counter())
+			try:
+				packets.put_nowait(item)
+			except queue.Full:
+				stats["full"] += 1
+				while not stop.is_set():
+					try:
+						packets.put(item, timeout=0.1)
+						break
+					except queue.Full:
+						pass
+			if stop.is_set():
+				break
+	except BaseException as e:					# El error se relanza en el hilo principal.
+		end = e
+	packets.put(end)
+
+# Devuelve el siguiente lote de la cola: hasta [batchSize] paquetes, sin
+# esperar más de [deadline] segundos desde que llega el primero. Devuelve
+# también si se ha acabado la entrada.
+def nextBatch(packets, batchSize, deadline, reportEvery):
+	batch = []
+	try:
+		item = packets.get(timeout=reportEvery or None)
+	except queue.Empty:
+		return batch, False						# Sin tráfico: solo toca mostrar el informe.
+	limit = time.perf_counter() + deadline
+	while True:
+		if item is None or isinstance(item, BaseException):
+			if isinstance(item, BaseException) and not isinstance(item, KeyboardInterrupt):
+				raise item
+			return batch, True
+		batch.append(item)
+		if len(batch) >= batchSize:
+			return batch, False
+		try:
+			item = packets.get(timeout=max(limit - time.perf_counter(), 0))
+		except queue.Empty:
+			return batch, False
+
+# Clasifica un lote y escribe la puntuación de cada paquete en [out]. El lote
+# se rellena con ceros hasta la siguiente potencia de 2 para que Keras no
+# tenga que recompilar el modelo con cada tamaño de lote distinto (el motor de
+# numpyModel.py recibe los bytes tal cual).
+def scoreBatch(model, batch, numFeatures, out, threshold, stats):
+	rows = 1 << max(len(batch) - 1, 0).bit_length()
+	x = np.zeros((rows, numFeatures), dtype=np.uint8)
+	x[:len(batch)] = np.frombuffer(b"".join(item[1] for item in batch), dtype=np.uint8).reshape(-1, numFeatures)
+	if not isinstance(model, numpyModel.NumpyMLP):
+		x = x.astype(np.float32) * (1 / 255)
+	scores = np.reshape(model.predict_on_batch(x), -1)[:len(batch)]
+	now = time.perf_counter()
+	out.write("".join(str(item[0]) + " " + "%.6f" % score + "\n" for item, score in zip(batch, scores)))
+	out.flush()
+	stats["packets"] += len(batch)
+	stats["anomalous"] += int(np.sum(scores >= threshold))
+	stats["latencies"].extend(now - item[2] for item in batch)
+
+# Muestra por la salida de errores los paquetes clasificados, los anómalos,
+# las veces que se ha llenado la cola y la latencia de los paquetes.
+def showReport(stats, packets):
+	elapsed = time.perf_counter() - stats["start"]
+	latencies = np.array(stats["latencies"] or [0.0]) * 1000
+	print("· " + str(stats["packets"]) + " paquetes (" + "%.0f" % (stats["packets"] / max(elapsed, 1e-9)) +
+		" paquetes/s), " + str(stats["anomalous"]) + " anómalos, cola " + str(packets.qsize()) + "/" +
+		str(packets.maxsize) + " (llena " + str(stats["full"]) + " veces)", file=sys.stderr)
+	print("· Latencia por paquete (ms): p50 = " + "%.2f" % np.percentile(latencies, 50) +
+		", p99 = " + "%.2f" % np.percentile(latencies, 99) + ", máx = " + "%.2f" % latencies.max(),
+		file=sys.stderr, flush=True)
+
+# Sigue [inputFile] y clasifica sus paquetes hasta que se acaba la entrada,
+# pasan [idle] segundos sin paquetes nuevos o se interrumpe el programa.
+def scoreLive(model, numFeatures, inputFile, outputFile, options):
+	packets = queue.Queue(maxsize=int(options["queue"]))
+	stats = newStats()
+	stop = threading.Event()
+	reader = threading.Thread(target=readPackets, daemon=True,
+		args=(inputFile, numFeatures, packets, stats, stop, float(options["idle"])))
+	reader.start()
+	batchSize = int(options["batch"])
+	deadline = float(options["deadline"]) / 1000
+	threshold = float(options["threshold"])
+	reportEvery = float(options["report"])
+	lastReport = time.perf_counter()
+	out = sys.stdout if outputFile == "-" else open(outputFile, "w")
+	try:
+		finished = False
+		while not finished:
+			batch, finished = nextBatch(packets, batchSize, deadline, reportEvery)
+			if batch:
+				scoreBatch(model, batch, numFeatures, out, threshold, stats)
+			if reportEvery and time.perf_counter() - lastReport >= reportEvery:
+				showReport(stats, packets)
+				lastReport = time.perf_counter()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		stop.set()
+		if out is not sys.stdout:
+			out.close()
+	showReport(stats, packets)
+
+modelPath, inputFile, outputFile, options = checkExecution()
+try:
+	model, metadata = modelStore.loadModel(modelPath)
+except (OSError, ValueError) as e:
+	print("Error: " + str(e))
+	sys.exit(1)
+signal.signal(signal.SIGTERM, signal.default_int_handler)		# kill => como Ctrl+C.
+scoreLive(model, metadata["numFeatures"], inputFile, outputFile, options)
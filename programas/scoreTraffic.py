@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa que clasifica tráfico nuevo con una red neuronal ya entrenada y
+# guardada por NNForNetworkTraffic.py (ver modelStore.py), sin volver a
+# entrenarla.
+#
+# El modelo se carga una sola vez y los paquetes se leen por lotes grandes,
+# que se preparan en un hilo aparte (ver streamDataset.py) mientras la red
+# neuronal clasifica el lote anterior. Así, el fichero de entrada no tiene que
+# caber en memoria.
+#
+# Con un modelo exportado a .npz (ver numpyModel.py) no se carga Keras: el
+# programa arranca mucho antes y los lotes se clasifican como bytes (uint8),
+# sin normalizarlos antes.
+
+# ENTRADAS:
+# [model.keras] => modelo guardado por NNForNetworkTraffic.py (con su .json) o
+#				  exportado a .npz con numpyModel.py.
+# [inputFile] => paquetes a clasificar: fichero .txt (de fromPcapToTxt.sh),
+#				 .npy (de fromPcapToNpy.py) o captura .pcap/.pcapng.
+# [batch] => (opcional) paquetes por lote (8192 por defecto).
+# [cacheDir] => (opcional) directorio de la caché de paquetes ya leídos de los
+#				ficheros .txt (ver datasetCache.py). Vacío para no usarla.
+
+# SALIDAS:
+# 1. Fichero [outputFile] con la puntuación de cada paquete (una por línea y
+# en el mismo orden que en [inputFile]): la probabilidad (0-1) de que sea
+# tráfico anómalo según la red neuronal.
+#
+# 2. Paquetes clasificados por segundo y latencia de cada lote (mediana, p99
+# y máxima).
+
+# EJEMPLO DE EJECUCIÓN:
+# python3 scoreTraffic.py modelo-ipv6-NS.keras captura.pcap puntuaciones.txt [batch=8192] [cache=/tmp/cache-tfg]
+###############################################################################
+
+import modelStore
+import numpyModel
+import streamDataset as sds
+import datasetCache as cache
+import numpy as np
+import time
+import sys
+
+TAM_LOTE = 8192			# Paquetes por lote.
+
+# Comprueba si se ha ejecutado bien el programa. Si está bien ejecutado,
+# devuelve [model.keras], [inputFile], [outputFile] y las opciones que se
+# hayan indicado detrás (como [opción]=[valor]).
+def checkExecution():
+	options = {"batch": str(TAM_LOTE), "cache": cache.DIR_CACHE}
+	optionsArgv = [arg.split("=")[0] for arg in sys.argv[4:]]
+	if len(sys.argv) < 4 or not all(key in options for key in optionsArgv):
+		print("usage: python3 scoreTraffic.py [model.keras] [inputFile] [outputFile] " +
+			"[batch=[packets]] [cache=[cacheDir]]")
+		sys.exit(1)
+	for arg in sys.argv[4:]:
+		key, value = arg.split("=", 1)
+		options[key] = value
+	return sys.argv[1], sys.argv[2], sys.argv[3], options
+
+# Devuelve los lotes del fichero, preparados en un hilo aparte y, si se pide
+# [normalize], normalizados a float32 (como en el entrenamiento).
+def prepareBatches(inputFile, numFeatures, batchSize, cacheDir, normalize=True):
+	batches = sds.iterBatches(inputFile, numFeatures, batchSize, cacheDir)
+	if not normalize:
+		return sds.prefetch(batches)
+	return sds.prefetch(x.astype(np.float32) * (1 / 255) for x in batches)
+
+# Clasifica los paquetes de [inputFile] lote a lote y escribe la puntuación
+# de cada uno en [outputFile]. Devuelve el número de paquetes y la latencia
+# (segundos) de cada lote.
+def scorePackets(model, numFeatures, inputFile, outputFile, batchSize, cacheDir=None):
+	count = 0
+	latencies = []
+	normalize = not isinstance(model, numpyModel.NumpyMLP)		# El motor de NumPy acepta bytes.
+	with open(outputFile, "w") as f:
+		for x in prepareBatches(inputFile, numFeatures, batchSize, cacheDir, normalize):
+			start = time.perf_counter()
+			scores = np.reshape(model.predict_on_batch(x), -1)
+			latencies.append(time.perf_counter() - start)
+			np.savetxt(f, scores, fmt="%.6f")
+			count += len(scores)
+	return count, latencies
+
+# Muestra cuántos paquetes se han clasificado, a qué velocidad y la latencia
+# de los lotes.
+def showReport(count, latencies, elapsed):
+	latencies = np.array(latencies or [0.0]) * 1000
+	print("· " + str(count) + " paquetes en " + "%.2f" % elapsed + " s (" +
+		"%.0f" % (count / max(elapsed, 1e-9)) + " paquetes/s)")
+	print("· Latencia por lote (ms): p50 = " + "%.2f" % np.percentile(latencies, 50) +
+		", p99 = " + "%.2f" % np.percentile(latencies, 99) + ", máx = " + "%.2f" % latencies.max())
+
+modelPath, inputFile, outputFile, options = checkExecution()
+try:
+	model, metadata = modelStore.loadModel(modelPath)
+except (OSError, ValueError) as e:
+	print("Error: " + str(e))
+	sys.exit(1)
+start = time.perf_counter()
+count, latencies = scorePackets(model, metadata["numFeatures"], inputFile, outputFile,
+	int(options["batch"]), options["cache"] or None)
+showReport(count, latencies, time.perf_counter() - start)
@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa que reparte en training, validation y test set los paquetes de una
+# fuente de tráfico "bueno" y otra de tráfico "malo" (de cualquier tamaño), en
+# lugar de extraer cada subconjunto por separado con fromPcapToTxt.sh y rangos
+# de frame.number escritos a mano.
+#
+# Cada fuente se lee una sola vez, por bloques (ver streamDataset.py), y a
+# cada paquete se le asigna un subconjunto al azar según [ratios]. La
+# secuencia aleatoria sale solo de [seed] y de la posición del paquete en la
+# fuente, así que el reparto es siempre el mismo (sea cual sea el tamaño de
+# los bloques).
+#
+# Si se indica cuántos paquetes de cada clase se quieren en un subconjunto
+# ([train], [val] o [test]), se toma una muestra uniforme de ese tamaño entre
+# los que le tocan (muestreo "bottom-k", equivalente a un reservoir sampling):
+# con el mismo número para las dos clases, el subconjunto queda equilibrado.
+# La memoria depende solo de esos tamaños y del de los bloques, no del de las
+# fuentes; los subconjuntos sin tamaño se van escribiendo a disco.
+
+# ENTRADAS:
+# [numFeatures] => número de bytes que caracterizan a cada uno de los paquetes.
+# [goodFile] => fichero .txt, .npy o captura (.pcap o .pcapng) con el tráfico "bueno".
+# [badFile] => fichero .txt, .npy o captura (.pcap o .pcapng) con el tráfico "malo".
+# [outputDir] => directorio donde se guardan los seis ficheros .npy.
+# [ratios] => (opcional) proporción de paquetes para training, validation y
+#			  test (0.6,0.2,0.2 por defecto).
+# [train], [val], [test] => (opcional) paquetes de cada clase en ese
+#							subconjunto (por defecto, todos los que le tocan).
+# [seed] => (opcional) semilla del reparto (0 por defecto).
+# [cacheDir] => (opcional) directorio de la caché (ver datasetCache.py).
+
+# SALIDAS:
+# Ficheros [outputDir]/good-train.npy, bad-train.npy, good-val.npy,
+# bad-val.npy, good-test.npy y bad-test.npy (matrices uint8, un paquete por
+# fila), que se pueden pasar directamente a NNForNetworkTraffic.py.
+
+# EJEMPLO DE EJECUCIÓN:
+# python3 splitDataset.py features=88 good=cap-ipv6.pcap bad=cap-ipv6-NS.pcap
+#	output=datasets-ipv6-NS [ratios=0.6,0.2,0.2] [train=200000] [val=50000]
+#	[test=50000] [seed=0] [cache=/tmp/cache-tfg]
+###############################################################################
+
+import streamDataset as sds
+import numpy as np
+import shutil
+import time
+import sys
+import os
+
+SPLITS = ["train", "val", "test"]
+
+# Comprueba si se ha ejecutado bien el programa. Si está bien ejecutado,
+# devuelve las opciones (como [opción]=[valor]).
+def checkExecution():
+	options = {"features": None, "good": None, "bad": None, "output": None, "ratios": "0.6,0.2,0.2",
+		"train": "", "val": "", "test": "", "seed": "0", "cache": ""}
+	optionsArgv = [arg.split("=")[0] for arg in sys.argv[1:]]
+	if not all(key in options for key in optionsArgv) or \
+			not all(key in optionsArgv for key in ["features", "good", "bad", "output"]):
+		print("usage: python3 splitDataset.py features=[numFeatures] good=[goodFile] bad=[badFile] " +
+			"output=[outputDir] [ratios=[train,val,test]] [train=[N]] [val=[N]] [test=[N]] " +
+			"[seed=[N]] [cache=[cacheDir]]")
+		sys.exit(1)
+	for arg in sys.argv[1:]:
+		key, value = arg.split("=", 1)
+		options[key] = value
+	ratios = [float(r) for r in options.get("ratios").split(",")]
+	if len(ratios) != 3 or min(ratios) < 0 or sum(ratios) <= 0:
+		print("Error: ratios debe tener tres proporciones no negativas (train,val,test)")
+		sys.exit(1)
+	return options
+
+# Matriz .npy que se escribe por bloques sin saber cuántas filas tendrá: las
+# filas van a un fichero temporal y, al cerrarla, se escribe la cabecera .npy
+# y se copian detrás.
+class NpyWriter:
+	def __init__(self, path, numFeatures):
+		self.path = path
+		self.numFeatures = numFeatures
+		self.rows = 0
+		self.tmp = open(path + ".tmp-" + str(os.getpid()), "w+b")
+
+	def write(self, rows):
+		self.tmp.write(np.ascontiguousarray(rows, dtype=np.uint8).tobytes())
+		self.rows += len(rows)
+
+	def close(self):
+		header = {"descr": "|u1", "fortran_order": False, "shape": (self.rows, self.numFeatures)}
+		self.tmp.seek(0)
+		with open(self.path, "wb") as f:
+			np.lib.format.write_array_header_1_0(f, header)
+			shutil.copyfileobj(self.tmp, f, 1 << 22)
+		self.tmp.close()
+		os.remove(self.tmp.name)
+
+# Muestra uniforme de [size] filas de un flujo (sin reemplazamiento): se queda
+# con las filas de claves aleatorias más pequeñas. Las filas se acumulan hasta
+# tener el doble de las necesarias y entonces se descartan las sobrantes; una
+# vez lleno, ya no entran las filas con una clave mayor que la última que se
+# ha quedado. Guarda también su posición en la fuente para devolverlas en su
+# orden original.
+class Reservoir:
+	def __init__(self, size, numFeatures):
+		self.size = size
+		self.keys = np.empty(0)
+		self.index = np.empty(0, dtype=np.int64)
+		self.rows = np.empty((0, numFeatures), dtype=np.uint8)
+		self.threshold = np.inf
+
+	def write(self, rows, keys, index):
+		mask = keys < self.threshold
+		self.keys = np.concatenate([self.keys, keys[mask]])
+		self.index = np.concatenate([self.index, index[mask]])
+		self.rows = np.concatenate([self.rows, rows[mask]])
+		if len(self.keys) > 2 * self.size:
+			self.prune()
+
+	def prune(self):
+		if len(self.keys) <= self.size:
+			return
+		keep = np.argpartition(self.keys, self.size - 1)[:self.size] if self.size else np.empty(0, dtype=np.int64)
+		self.keys, self.index, self.rows = self.keys[keep], self.index[keep], self.rows[keep]
+		self.threshold = self.keys.max() if self.size else -np.inf
+
+	def result(self):
+		self.prune()
+		return self.rows[np.argsort(self.index)]
+
+# Reparte los paquetes de [path] (clase [label]: 0 bueno, 1 malo) entre los
+# subconjuntos y los guarda en [outputDir]. Devuelve cuántos paquetes ha
+# leído y cuántos ha guardado en cada subconjunto.
+def splitSource(path, label, numFeatures, ratios, counts, seed, outputDir, cacheDir=None):
+	bounds = np.cumsum(ratios) / np.sum(ratios)
+	bounds[-1] = 1.0
+	splitRng = np.random.default_rng([seed, label, 0])		# Subconjunto de cada paquete.
+	keyRng = np.random.default_rng([seed, label, 1])		# Clave del muestreo.
+	kind = "bad" if label else "good"
+	outputs = []
+	for split, count in zip(SPLITS, counts):
+		if count is None:
+			outputs.append(NpyWriter(os.path.join(outputDir, kind + "-" + split + ".npy"), numFeatures))
+		else:
+			outputs.append(Reservoir(count, numFeatures))
+	total = 0
+	for block in sds.iterBlocks(path, numFeatures, cacheDir):
+		splits = np.searchsorted(bounds, splitRng.random(len(block)), side="right")
+		keys = keyRng.random(len(block))
+		index = np.arange(total, total + len(block))
+		for s, output in enumerate(outputs):
+			mask = splits == s
+			if isinstance(output, Reservoir):
+				output.write(block[mask], keys[mask], index[mask])
+			else:
+				output.write(block[mask])
+		total += len(block)
+
+	saved = []
+	for split, output in zip(SPLITS, outputs):
+		if isinstance(output, Reservoir):
+			rows = output.result()
+			np.save(os.path.join(outputDir, kind + "-" + split + ".npy"), rows)
+			saved.append(len(rows))
+		else:
+			output.close()
+			saved.append(output.rows)
+	return total, saved
+
+# Reparte las dos fuentes y muestra cuántos paquetes quedan en cada
+# subconjunto (avisando si alguno no llega al tamaño pedido).
+def splitDataset(goodPath, badPath, numFeatures, ratios, counts, seed, outputDir, cacheDir=None):
+	os.makedirs(outputDir, exist_ok=True)
+	for label, path in enumerate([goodPath, badPath]):
+		start = time.perf_counter()
+		total, saved = splitSource(path, label, numFeatures, ratios, counts, seed, outputDir, cacheDir)
+		elapsed = max(time.perf_counter() - start, 1e-9)
+		print("· " + path + ": " + str(total) + " paquetes en " + "%.2f" % elapsed + " s (" +
+			"%.0f" % (total / elapsed) + " paquetes/s) => " +
+			", ".join(split + " " + str(n) for split, n in zip(SPLITS, saved)))
+		for split, n, count in zip(SPLITS, saved, counts):
+			if count is not None and n < count:
+				print("  Aviso: " + split + " tiene " + str(n) + " paquetes de " + str(count) + " pedidos")
+
+if __name__ == "__main__":
+	options = checkExecution()
+	numFeatures = int(options.get("features"))
+	ratios = [float(r) for r in options.get("ratios").split(",")]
+	counts = [int(options.get(split)) if options.get(split) else None for split in SPLITS]
+	outputDir = options.get("output")
+	splitDataset(options.get("good"), options.get("bad"), numFeatures, ratios, counts,
+		int(options.get("seed")), outputDir, options.get("cache") or None)
+	print("· Para entrenar la red neuronal:")
+	print("  python3 NNForNetworkTraffic.py features=" + str(numFeatures) + " " + " ".join(
+		kind + "X" + split.capitalize() + "=" + os.path.join(outputDir, kind + "-" + split + ".npy")
+		for split in SPLITS for kind in ["good", "bad"]))
@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa auxiliar para saber en qué se va el tiempo de una ejecución: mide
+# cada paso (carga de los datasets, generación de las capturas anómalas,
+# entrenamiento y test de la red neuronal) y guarda su tiempo real, su tiempo
+# de CPU, las filas (paquetes) que procesa, los bytes que lee y su pico de
+# memoria.
+#
+# Solo se activa con la variable de entorno TFG_PROFILE. Si no está, stage()
+# devuelve la función tal cual y las demás funciones no hacen nada, así que no
+# cuesta nada tenerlo en el código.
+#
+# Los bytes leídos y el pico de memoria se sacan de /proc (Linux): el pico se
+# reinicia al empezar cada paso (/proc/self/clear_refs), de modo que es el del
+# paso y no el de todo el proceso. Donde no hay /proc se guarda None y el pico
+# de memoria de todo el proceso, respectivamente.
+
+# ENTRADAS (variables de entorno):
+# TFG_PROFILE => 1 para mostrar el resumen de los pasos al acabar (por la
+#				 salida de errores) o el nombre de un fichero .json donde
+#				 guardarlo.
+# TFG_CPROFILE => (opcional) directorio donde guardar un perfil de cProfile
+#				  (.prof) de cada paso, para verlo con "python3 -m pstats" o
+#				  snakeviz.
+
+# SALIDAS:
+# Resumen con un registro por paso: nombre, tiempo real y de CPU (s), filas,
+# bytes leídos, pico de memoria (MB) y, en el entrenamiento, el tiempo de cada
+# época.
+
+# EJEMPLO DE EJECUCIÓN:
+# TFG_PROFILE=perfil.json TFG_CPROFILE=/tmp/perfiles python3 NNForNetworkTraffic.py features=88 ...
+#
+# import stageProfiler as prof
+# @prof.stage("createDataset", rows=len)
+# def createDataset(...):
+###############################################################################
+
+import functools
+import resource
+import cProfile
+import atexit
+import json
+import time
+import sys
+import os
+
+PROFILE = os.environ.get("TFG_PROFILE", "")
+CPROFILE_DIR = os.environ.get("TFG_CPROFILE", "")
+ENABLED = PROFILE not in ("", "0")
+
+records = []		# Pasos ya terminados.
+openStages = []		# Pasos en curso (uno dentro de otro).
+
+# Devuelve los bytes leídos por el proceso hasta ahora (None sin /proc).
+def bytesRead():
+	try:
+		with open("/proc/self/io") as f:
+			for line in f:
+				if line.startswith("rchar:"):
+					return int(line.split()[1])
+	except OSError:
+		return None
+
+# Reinicia el pico de memoria del proceso (si se puede) para medir el del paso.
+def resetPeakMemory():
+	try:
+		with open("/proc/self/clear_refs", "w") as f:
+			f.write("5")
+	except OSError:
+		pass
+
+# Devuelve el pico de memoria (MB) desde el último reinicio o, si no se puede
+# leer, el de todo el proceso.
+def peakMemory():
+	try:
+		with open("/proc/self/status") as f:
+			for line in f:
+				if line.startswith("VmHWM:"):
+					return int(line.split()[1]) / 1024
+	except OSError:
+		pass
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Empieza un paso: se apuntan los contadores al inicio y, si se ha pedido, se
+# activa cProfile (solo en el paso más externo, ya que no se pueden anidar).
+def startStage(name):
+	stage = {"stage": name, "rows": None, "epochs": None, "childPeak": 0.0, "profiler": None}
+	if CPROFILE_DIR and not openStages:
+		stage["profiler"] = cProfile.Profile()
+	openStages.append(stage)
+	resetPeakMemory()
+	stage["bytes"] = bytesRead()
+	stage["cpu"] = time.process_time()
+	stage["wall"] = time.perf_counter()
+	if stage["profiler"] is not None:
+		stage["profiler"].enable()
+	return stage
+
+# Termina el paso en curso y guarda su registro. El pico de memoria de un paso
+# incluye el de los pasos que tiene dentro (que reinician el contador).
+def endStage(stage):
+	if stage["profiler"] is not None:
+		stage["profiler"].disable()
+	wall = time.perf_counter() - stage["wall"]
+	cpu = time.process_time() - stage["cpu"]
+	endBytes = bytesRead()
+	peak = max(peakMemory(), stage["childPeak"])
+	openStages.remove(stage)
+	if openStages:
+		openStages[-1]["childPeak"] = max(openStages[-1]["childPeak"], peak)
+	record = {"stage": stage["stage"], "wallSeconds": round(wall, 4), "cpuSeconds": round(cpu, 4),
+		"rows": stage["rows"], "bytesRead": None if endBytes is None else endBytes - stage["bytes"],
+		"peakMB": round(peak, 1)}
+	if stage["epochs"] is not None:
+		record["epochSeconds"] = stage["epochs"]
+	if stage["profiler"] is not None:
+		os.makedirs(CPROFILE_DIR, exist_ok=True)
+		record["cprofile"] = os.path.join(CPROFILE_DIR, stage["stage"] + "-" + str(len(records)) + ".prof")
+		stage["profiler"].dump_stats(record["cprofile"])
+	records.append(record)
+
+# Decorador que mide la función como un paso llamado [name]. Si se indica
+# [rows], las filas del paso son rows(resultado) (además de las que se sumen
+# con addRows() durante el paso).
+def stage(name, rows=None):
+	def decorator(function):
+		if not ENABLED:
+			return function
+
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			current = startStage(name)
+			try:
+				result = function(*args, **kwargs)
+				if rows is not None:
+					addRows(rows(result))
+				return result
+			finally:
+				endStage(current)
+		return wrapper
+	return decorator
+
+# Suma [count] filas procesadas al paso en curso.
+def addRows(count):
+	if ENABLED and openStages:
+		stage = openStages[-1]
+		stage["rows"] = (stage["rows"] or 0) + int(count)
+
+# Callbacks de Keras para model.fit(): con el perfilado activado, uno que
+# guarda el tiempo de cada época en el paso en curso.
+def kerasCallbacks():
+	if not ENABLED or not openStages:
+		return []
+	from keras import callbacks
+
+	stage = openStages[-1]
+
+	class EpochTimer(callbacks.Callback):
+		def on_epoch_begin(self, epoch, logs=None):
+			self.start = time.perf_counter()
+
+		def on_epoch_end(self, epoch, logs=None):
+			stage["epochs"] = (stage["epochs"] or []) + [round(time.perf_counter() - self.start, 4)]
+	return [EpochTimer()]
+
+# Muestra el resumen de los pasos por la salida de errores o lo guarda en el
+# fichero .json de TFG_PROFILE.
+def report():
+	if not records:
+		return
+	if PROFILE != "1":
+		with open(PROFILE, "w") as f:
+			json.dump(records, f, indent=4)
+		print("· Perfil de los pasos en " + PROFILE, file=sys.stderr)
+		return
+	print("", file=sys.stderr)
+	print("  " + "paso".ljust(24) + "%10s" % "real (s)" + "%10s" % "CPU (s)" + "%12s" % "filas" +
+		"%12s" % "MB leídos" + "%10s" % "pico MB", file=sys.stderr)
+	for record in records:
+		rows = "-" if record["rows"] is None else str(record["rows"])
+		read = "-" if record["bytesRead"] is None else "%.1f" % (record["bytesRead"] / 1e6)
+		print("  " + record["stage"].ljust(24) + "%10.3f" % record["wallSeconds"] + "%10.3f" % record["cpuSeconds"] +
+			rows.rjust(12) + read.rjust(12) + "%10.1f" % record["peakMB"], file=sys.stderr)
+		if "epochSeconds" in record:
+			print("    épocas (s): " + ", ".join("%.3f" % s for s in record["epochSeconds"]), file=sys.stderr)
+
+if ENABLED:
+	atexit.register(report)
@@ -0,0 +1,199 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa auxiliar para entrenar la red neuronal con capturas que no caben en
+# memoria. En lugar de cargar los ficheros enteros (como createDataset() de
+# readTxtFile.py), se leen por bloques el fichero de tráfico "bueno" y el de
+# tráfico "malo", se intercalan con sus etiquetas (y = 0 o y = 1) y se mezclan
+# a través de un buffer de tamaño fijo. Los lotes se preparan en un hilo aparte
+# mientras la red neuronal entrena con el lote anterior.
+#
+# Así, la memoria que se usa depende solo del tamaño del buffer y no del de
+# las capturas.
+
+# ENTRADAS:
+# goodPath => fichero .txt, .npy o captura (.pcap o .pcapng) con el tráfico "bueno".
+# badPath => fichero .txt, .npy o captura (.pcap o .pcapng) con el tráfico "malo".
+# numFeatures => número de bytes que caracterizan a cada uno de los paquetes.
+# batchSize => número de muestras por lote.
+# bufferRows => número de muestras que caben en el buffer de mezcla.
+# cacheDir => (opcional) directorio de la caché (ver datasetCache.py).
+
+# SALIDAS:
+# Lotes (x, y) con las muestras normalizadas a float32 (0-1) y sus etiquetas.
+
+# EJEMPLO DE EJECUCIÓN:
+# import streamDataset as sds
+# batches = sds.streamBatches("cap-ipv6-train.txt", "cap-ipv6-train-NS.txt", 88, 512, 65536)
+###############################################################################
+
+import readTxtFile as rtxt
+import readPcapFile as rpcap
+import datasetCache as cache
+import numpy as np
+import threading
+import queue
+
+TAM_BUFFER = 1 << 16		# Muestras en el buffer de mezcla.
+LOTES_PREPARADOS = 8		# Lotes que se preparan por adelantado.
+
+# Devuelve si un fichero es una captura (se lee con readPcapFile.py).
+def isCapture(path):
+	return path.endswith((".pcap", ".pcapng"))
+
+# Devuelve la matriz uint8 mapeada en memoria de un fichero .npy o de la
+# entrada de la caché de un .txt (None si no la tiene).
+def findBinary(path, numFeatures, cacheDir=None):
+	if path.endswith(".npy"):
+		return rtxt.loadNpyFile(path, numFeatures)
+	return cache.findCached(path, numFeatures, cacheDir) if cacheDir else None
+
+# Devuelve el número de paquetes de un fichero .txt (líneas), de un .npy, de
+# una matriz de la caché o de una captura, sin decodificarlos.
+def countRows(path, numFeatures, cacheDir=None):
+	if isCapture(path):
+		with open(path, "rb") as f:
+			return sum(1 for _ in rpcap.iterFrames(f))
+	data = findBinary(path, numFeatures, cacheDir)
+	if data is not None:
+		return len(data)
+	counter = 0
+	last = b"\n"
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(rtxt.TAM_BLOQUE), b""):
+			counter += chunk.count(b"\n")
+			last = chunk[-1:]
+	return counter + (last != b"\n")		# La última línea puede no acabar en "\n".
+
+# Recorre los paquetes de un fichero por bloques (matrices uint8). Si el
+# fichero es un .npy o ya está en la caché, se recorre su matriz mapeada en
+# memoria; si es una captura, se extraen los bytes de sus tramas.
+def iterBlocks(path, numFeatures, cacheDir=None, blockRows=TAM_BUFFER // 4):
+	if isCapture(path):
+		yield from rpcap.iterFeatureBlocks(path, numFeatures, blockRows=blockRows)
+		return
+	data = findBinary(path, numFeatures, cacheDir)
+	if data is None:
+		yield from rtxt.iterTxtBlocks(path, numFeatures)
+		return
+	for start in range(0, len(data), blockRows):
+		yield np.asarray(data[start:start + blockRows])
+
+# Recorre los paquetes de un fichero en lotes uint8 de [batchSize] filas (el
+# último puede tener menos), sin etiquetas ni mezcla (para clasificarlos).
+def iterBatches(path, numFeatures, batchSize, cacheDir=None):
+	batch = np.empty((batchSize, numFeatures), dtype=np.uint8)
+	count = 0
+	for block in iterBlocks(path, numFeatures, cacheDir, blockRows=batchSize):
+		start = 0
+		while start < len(block):
+			n = min(len(block) - start, batchSize - count)
+			batch[count:count + n] = block[start:start + n]
+			count += n
+			start += n
+			if count == batchSize:
+				yield batch.copy()
+				count = 0
+	if count:
+		yield batch[:count].copy()
+
+# Intercala los bloques del tráfico "bueno" y "malo" con sus etiquetas, en
+# trozos de [pieceRows] paquetes, de modo que ambos se recorren al mismo ritmo
+# aunque tengan distinto tamaño. [totals] son los paquetes de cada fichero
+# (si no se indican, se cuentan).
+def interleave(goodPath, badPath, numFeatures, cacheDir=None, pieceRows=1024, totals=None):
+	if totals is None:
+		totals = [countRows(path, numFeatures, cacheDir) for path in [goodPath, badPath]]
+	sources = []
+	for label, (path, total) in enumerate(zip([goodPath, badPath], totals)):
+		sources.append({"blocks": iterBlocks(path, numFeatures, cacheDir), "label": label,
+			"total": max(total, 1), "done": 0, "block": None, "offset": 0})
+	while sources:
+		# Se lee de la fuente que lleva recorrida una fracción menor de sus paquetes.
+		source = min(sources, key=lambda s: s["done"] / s["total"])
+		if source["block"] is None or source["offset"] >= len(source["block"]):
+			source["block"] = next(source["blocks"], None)
+			source["offset"] = 0
+			if source["block"] is None:
+				sources.remove(source)
+			continue
+		piece = source["block"][source["offset"]:source["offset"] + pieceRows]
+		source["offset"] += len(piece)
+		source["done"] += len(piece)
+		yield piece, np.full(len(piece), source["label"], dtype=np.float32)
+
+# Devuelve el lote (x, y) con las muestras normalizadas a float32.
+def toBatch(x, y):
+	return x.astype(np.float32) * (1 / 255), np.array(y)
+
+# Mezcla los bloques (x, y) con un buffer de [bufferRows] muestras: cuando se
+# llena, se desordena y se sacan lotes con la primera mitad; la segunda mitad
+# se queda en el buffer para mezclarse con los bloques siguientes.
+def shuffleBatches(blocks, numFeatures, batchSize, bufferRows, rng):
+	bufferRows = max(bufferRows, 2 * batchSize)
+	bufferX = np.empty((bufferRows + batchSize, numFeatures), dtype=np.uint8)
+	bufferY = np.empty(bufferRows + batchSize, dtype=np.float32)
+	count = 0
+	for x, y in blocks:
+		start = 0
+		while start < len(x):
+			n = min(len(x) - start, len(bufferX) - count)
+			bufferX[count:count + n] = x[start:start + n]
+			bufferY[count:count + n] = y[start:start + n]
+			count += n
+			start += n
+			if count < bufferRows:
+				continue
+			perm = rng.permutation(count)
+			bufferX[:count] = bufferX[perm]
+			bufferY[:count] = bufferY[perm]
+			flush = (count // 2) // batchSize * batchSize
+			for i in range(0, flush, batchSize):
+				yield toBatch(bufferX[i:i + batchSize], bufferY[i:i + batchSize])
+			bufferX[:count - flush] = bufferX[flush:count]
+			bufferY[:count - flush] = bufferY[flush:count]
+			count -= flush
+	perm = rng.permutation(count)
+	for i in range(0, count, batchSize):
+		idx = perm[i:i + batchSize]
+		yield toBatch(bufferX[idx], bufferY[idx])
+
+# Prepara en un hilo aparte los siguientes [depth] elementos de un generador.
+def prefetch(generator, depth=LOTES_PREPARADOS):
+	items = queue.Queue(maxsize=depth)
+	end = object()
+
+	def producer():
+		try:
+			for item in generator:
+				items.put(item)
+			items.put(end)
+		except BaseException as e:			# El error se relanza en el hilo principal.
+			items.put(e)
+
+	threading.Thread(target=producer, daemon=True).start()
+	while True:
+		item = items.get()
+		if item is end:
+			return
+		if isinstance(item, BaseException):
+			raise item
+		yield item
+
+# Devuelve los lotes (x, y) de los ficheros en streaming. Con [repeat] se
+# vuelve a recorrer los ficheros al acabar (una pasada por época). Los
+# paquetes de cada fichero ([totals]) se cuentan una sola vez, no en cada
+# pasada, si no se indican ya contados.
+def streamBatches(goodPath, badPath, numFeatures, batchSize, bufferRows=TAM_BUFFER,
+		cacheDir=None, repeat=False, seed=None, totals=None):
+	def batches():
+		rng = np.random.default_rng(seed)
+		counts = totals
+		if counts is None:
+			counts = [countRows(path, numFeatures, cacheDir) for path in [goodPath, badPath]]
+		while True:
+			blocks = interleave(goodPath, badPath, numFeatures, cacheDir, totals=counts)
+			yield from shuffleBatches(blocks, numFeatures, batchSize, bufferRows, rng)
+			if not repeat:
+				return
+	return prefetch(batches())
@@ -0,0 +1,208 @@
+#!/usr/bin/python3
+
+###############################################################################
+# Programa que compara varias configuraciones de la red neuronal (capas,
+# optimizador, tamaño de lote y épocas) con los mismos datasets, en lugar de
+# relanzar NNForNetworkTraffic.py una vez por configuración.
+#
+# Los ficheros se leen una sola vez (con la caché de datasetCache.py, si se
+# indica) y sus matrices uint8 se copian a memoria compartida. Cada prueba se
+# ejecuta en un proceso aparte (hasta [workers] a la vez, repartiendo los
+# núcleos de la CPU entre ellos), que usa esas matrices sin copiarlas. Con
+# [patience] > 0, el entrenamiento se para cuando la pérdida del validation
+# set deja de mejorar (y se queda con los mejores pesos).
+
+# ENTRADAS:
+# [numFeatures], [goodXTrainTxt]... [badXTestTxt] => como en NNForNetworkTraffic.py.
+# [units] => (opcional) capas ocultas a probar, separadas por comas y cada una
+#			 como neuronas por capa separadas por "x" (32x32 por defecto).
+# [optimizer] => (opcional) optimizadores de Keras a probar (rmsprop).
+# [batch] => (opcional) tamaños de lote a probar (512).
+# [epochs] => (opcional) épocas máximas a probar (20).
+# [patience] => (opcional) épocas sin mejorar antes de parar (3 por defecto;
+#				0 para no parar nunca).
+# [workers] => (opcional) pruebas a la vez (por defecto, una por núcleo).
+# [cacheDir], [MB] => (opcional) como en NNForNetworkTraffic.py.
+# [outputFile] => (opcional) tabla de resultados .csv (sweep.csv).
+
+# SALIDAS:
+# Tabla [outputFile] (se puede abrir con la hoja de resultados.ods) con una
+# fila por prueba, que se escribe en cuanto acaba: configuración, épocas
+# entrenadas, mejor pérdida de validación, tiempo de entrenamiento, paquetes/s
+# de entrenamiento (como ThroughputReport de NNForNetworkTraffic.py: sin las
+# pasadas por el validation set ni la primera época), y exactitud,
+# precision, recall, F1 y AUC ROC/PR del test set.
+
+# EJEMPLO DE EJECUCIÓN:
+# python3 sweepNN.py features=88
+#	goodXTrain=cap-ipv6-train.txt	badXTrain=cap-ipv6-train-NS.txt
+#	goodXVal=cap-ipv6-val.txt		badXVal=cap-ipv6-val-NS.txt
+#	goodXTest=cap-ipv6-test.txt		badXTest=cap-ipv6-test-NS.txt
+#	[units=32x32,64x32,128]			[optimizer=rmsprop,adam]
+#	[batch=512,2048]				[epochs=20]		[patience=3]
+#	[workers=4]						[output=sweep.csv]
+###############################################################################
+
+import readTxtFile as rtxt
+import datasetCache as cache
+import numpy as np
+from multiprocessing import shared_memory
+import multiprocessing
+import itertools
+import time
+import csv
+import sys
+import os
+
+# Columnas de la tabla de resultados.
+COLUMNS = ["trial", "units", "optimizer", "batch", "maxEpochs", "epochs", "bestValLoss", "trainSeconds",
+	"trainPacketsPerSecond", "accuracy", "precision", "recall", "f1", "rocAuc", "prAuc"]
+
+# Matrices de los datasets en memoria compartida, ya abiertas en cada proceso.
+sharedArrays = {}
+
+# Comprueba si se ha ejecutado bien el programa. Si está bien ejecutado,
+# devuelve [numFeatures], los ficheros de los datasets y las opciones que se
+# hayan indicado detrás (como [opción]=[valor]).
+def checkExecution():
+	datasetTxt = {}
+	options = {"units": "32x32", "optimizer": "rmsprop", "batch": "512", "epochs": "20", "patience": "3",
+		"workers": str(os.cpu_count() or 1), "cache": cache.DIR_CACHE, "cacheSize": str(cache.TAM_CACHE >> 20),
+		"output": "sweep.csv"}
+	optionsArgv = [arg.split("=")[0] for arg in sys.argv[8:]]
+	if len(sys.argv) < 8 or not all(key in options for key in optionsArgv):
+		print("usage: python3 sweepNN.py features=[numFeatures] " +
+			"goodXTrain=[goodXTrainTxt] badXTrain=[badXTrainTxt] " +
+			"goodXVal=[goodXValTxt] badXVal=[badXValTxt] " +
+			"goodXTest=[goodXTestTxt] badXTest=[badXTestTxt] " +
+			"[units=[32x32,...]] [optimizer=[rmsprop,...]] [batch=[512,...]] [epochs=[20,...]] " +
+			"[patience=[N]] [workers=[N]] [cache=[cacheDir]] [cacheSize=[MB]] [output=[outputFile]]")
+		sys.exit(1)
+	numFeatures = int(sys.argv[1].split("=")[-1])
+	for i, name in enumerate(["goodXTrainTxt", "badXTrainTxt", "goodXValTxt", "badXValTxt",
+			"goodXTestTxt", "badXTestTxt"]):
+		datasetTxt[name] = sys.argv[i + 2].split("=")[-1]
+	for arg in sys.argv[8:]:
+		key, value = arg.split("=", 1)
+		options[key] = value
+	return numFeatures, datasetTxt, options
+
+# Devuelve las pruebas: todas las combinaciones de los valores indicados.
+def buildTrials(options):
+	units = [tuple(int(n) for n in layer.split("x")) for layer in options.get("units").split(",")]
+	optimizers = options.get("optimizer").split(",")
+	batches = [int(n) for n in options.get("batch").split(",")]
+	epochs = [int(n) for n in options.get("epochs").split(",")]
+	return [{"trial": i + 1, "units": u, "optimizer": o, "batch": b, "maxEpochs": e}
+		for i, (u, o, b, e) in enumerate(itertools.product(units, optimizers, batches, epochs))]
+
+# Carga los ficheros de los datasets y copia sus matrices a memoria
+# compartida. Devuelve los bloques de memoria (para liberarlos al acabar) y,
+# por fichero, el nombre del bloque y la forma de la matriz.
+def shareDatasets(datasetTxt, numFeatures, options):
+	blocks, descriptors = [], {}
+	cacheDir = options.get("cache")
+	cacheBytes = int(options.get("cacheSize")) << 20
+	for name, path in datasetTxt.items():
+		data = rtxt.loadPackets(path, numFeatures, cacheDir, cacheBytes)
+		block = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+		np.ndarray(data.shape, dtype=np.uint8, buffer=block.buf)[:] = data
+		blocks.append(block)
+		descriptors[name] = (block.name, data.shape)
+	return blocks, descriptors
+
+# Abre en un proceso de las pruebas las matrices de memoria compartida y
+# reparte los hilos de TensorFlow entre las pruebas que se ejecutan a la vez.
+def initWorker(descriptors, threads):
+	for name, (blockName, shape) in descriptors.items():
+		block = shared_memory.SharedMemory(name=blockName)
+		sharedArrays[name] = (block, np.ndarray(shape, dtype=np.uint8, buffer=block.buf))
+	try:
+		import tensorflow as tf
+		tf.config.threading.set_intra_op_parallelism_threads(threads)
+		tf.config.threading.set_inter_op_parallelism_threads(1)
+	except ImportError:
+		pass
+
+# Devuelve el dataset (como generateDataset() de NNForNetworkTraffic.py) con
+# las matrices de memoria compartida y el tamaño de lote de la prueba.
+def sharedDataset(nn, batchSize):
+	dataset = {}
+	for part in ["Train", "Val", "Test"]:
+		packets = rtxt.PacketDataset(sharedArrays["goodX" + part + "Txt"][1], sharedArrays["badX" + part + "Txt"][1])
+		dataset[part.lower()] = nn.PacketSequence(packets, batchSize, shuffle=part == "Train")
+	dataset["trainRows"] = len(dataset["train"].packetDataset)
+	return dataset
+
+# Entrena y prueba la red neuronal de una prueba y devuelve su fila de la
+# tabla de resultados.
+def runTrial(trial, numFeatures, patience):
+	import NNForNetworkTraffic as nn
+	from keras import callbacks
+
+	dataset = sharedDataset(nn, trial["batch"])
+	model = nn.buildNN(numFeatures, trial["units"], trial["optimizer"])
+	stop = [callbacks.EarlyStopping(monitor="val_loss", patience=patience, restore_best_weights=True)] \
+		if patience > 0 else []
+	throughput = nn.ThroughputReport(dataset.get("trainRows"))
+	start = time.perf_counter()
+	history = nn.trainNN(model, dataset, numFeatures, None, trial["maxEpochs"], stop + [throughput])
+	elapsed = time.perf_counter() - start
+	summary = nn.evaluateNN(model, dataset)
+	row = dict(trial, units="x".join(str(n) for n in trial["units"]), epochs=len(history.epoch),
+		bestValLoss=min(history.history.get("val_loss", [float("nan")])), trainSeconds=elapsed,
+		trainPacketsPerSecond=throughput.meanRate())
+	row.update({key: summary.get(key) for key in ["accuracy", "precision", "recall", "f1", "rocAuc", "prAuc"]})
+	return row
+
+# Ejecuta la prueba sin la salida de Keras (el progreso de cada época de
+# varias pruebas a la vez no se podría leer).
+def runQuietTrial(trial, numFeatures, patience):
+	with open(os.devnull, "w") as devnull:
+		stdout, sys.stdout = sys.stdout, devnull
+		try:
+			return runTrial(trial, numFeatures, patience)
+		finally:
+			sys.stdout = stdout
+
+# Escribe una fila en la tabla de resultados y la muestra.
+def logTrial(writer, f, row):
+	writer.writerow({key: "%.6g" % value if isinstance(value, float) else value for key, value in row.items()})
+	f.flush()
+	print("· Prueba " + str(row["trial"]) + " (" + row["units"] + ", " + row["optimizer"] + ", lote " +
+		str(row["batch"]) + "): " + str(row["epochs"]) + " épocas, " + "%.0f" % row["trainPacketsPerSecond"] +
+		" paquetes/s, F1 = " + "%.4f" % row["f1"] + ", AUC ROC = " + "%.4f" % row["rocAuc"], flush=True)
+
+# Ejecuta las pruebas en [workers] procesos (creados con "spawn", ya que
+# TensorFlow no admite fork) y escribe cada resultado según acaba.
+def runSweep(trials, descriptors, numFeatures, options):
+	workers = max(1, min(int(options.get("workers")), len(trials)))
+	threads = max(1, (os.cpu_count() or 1) // workers)
+	patience = int(options.get("patience"))
+	context = multiprocessing.get_context("spawn")
+	with open(options.get("output"), "w", newline="") as f, \
+			context.Pool(workers, initWorker, (descriptors, threads)) as pool:
+		writer = csv.DictWriter(f, fieldnames=COLUMNS)
+		writer.writeheader()
+		results = [pool.apply_async(runQuietTrial, (trial, numFeatures, patience)) for trial in trials]
+		pending = list(results)
+		while pending:
+			for result in [r for r in pending if r.ready()]:
+				logTrial(writer, f, result.get())
+				pending.remove(result)
+			time.sleep(0.1)
+
+if __name__ == "__main__":
+	numFeatures, datasetTxt, options = checkExecution()
+	trials = buildTrials(options)
+	start = time.perf_counter()
+	blocks, descriptors = shareDatasets(datasetTxt, numFeatures, options)
+	try:
+		print("· " + str(len(trials)) + " pruebas con los datasets en memoria compartida (" +
+			"%.1f" % (sum(block.size for block in blocks) / 2**20) + " MiB)", flush=True)
+		runSweep(trials, descriptors, numFeatures, options)
+	finally:
+		for block in blocks:
+			block.close()
+			block.unlink()
+	print("· Resultados en " + options.get("output") + " (" + "%.1f" % (time.perf_counter() - start) + " s)")